@@ -0,0 +1,20 @@
+"""composite index for keyset pagination of tickets
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_tickets_date_received_id", "tickets", ["date_received", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tickets_date_received_id", table_name="tickets")
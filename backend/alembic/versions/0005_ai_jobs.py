@@ -0,0 +1,47 @@
+"""ai analysis job queue
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("reply_to_client", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("locked_at", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_ai_jobs_ticket_id", "ai_jobs", ["ticket_id"])
+    op.create_index("ix_ai_jobs_status_run_after", "ai_jobs", ["status", "run_after"])
+
+    # Заявки, которые так и не получили анализ до появления очереди
+    op.execute(
+        """
+        INSERT INTO ai_jobs (ticket_id)
+        SELECT id FROM tickets
+        WHERE (sentiment IS NULL OR category IS NULL)
+          AND (original_email IS NOT NULL OR summary IS NOT NULL)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ai_jobs_status_run_after", table_name="ai_jobs")
+    op.drop_index("ix_ai_jobs_ticket_id", table_name="ai_jobs")
+    op.drop_table("ai_jobs")
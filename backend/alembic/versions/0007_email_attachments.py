@@ -0,0 +1,36 @@
+"""lazy email attachment references
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "email_attachments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("mailbox", sa.String(255), nullable=False),
+        sa.Column("uidvalidity", sa.BigInteger(), nullable=False),
+        sa.Column("uid", sa.BigInteger(), nullable=False),
+        sa.Column("part", sa.String(50), nullable=False),
+        sa.Column("filename", sa.Text()),
+        sa.Column("mime_type", sa.String(100)),
+        sa.Column("encoding", sa.String(30), nullable=False, server_default="7bit"),
+        sa.Column("size", sa.BigInteger()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_email_attachments_ticket_id", "email_attachments", ["ticket_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_email_attachments_ticket_id", table_name="email_attachments")
+    op.drop_table("email_attachments")
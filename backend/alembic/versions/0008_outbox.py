@@ -0,0 +1,43 @@
+"""transactional outbox for client emails
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("idempotency_key", sa.String(100), nullable=False),
+        sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id", ondelete="CASCADE")),
+        sa.Column("chat_message_id", sa.Integer(), sa.ForeignKey("chat_messages.id", ondelete="CASCADE")),
+        sa.Column("to_email", sa.String(255), nullable=False),
+        sa.Column("subject", sa.String(255), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("locked_at", sa.DateTime(timezone=True)),
+        sa.Column("sent_at", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("idempotency_key"),
+        sa.UniqueConstraint("chat_message_id"),
+    )
+    op.create_index("ix_outbox_ticket_id", "outbox", ["ticket_id"])
+    op.create_index("ix_outbox_status_run_after", "outbox", ["status", "run_after"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_status_run_after", table_name="outbox")
+    op.drop_index("ix_outbox_ticket_id", table_name="outbox")
+    op.drop_table("outbox")
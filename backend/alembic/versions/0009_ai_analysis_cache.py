@@ -0,0 +1,31 @@
+"""ai analysis result cache
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_analysis_cache",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("result", JSONB(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_ai_analysis_cache_expires_at", "ai_analysis_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ai_analysis_cache_expires_at", table_name="ai_analysis_cache")
+    op.drop_table("ai_analysis_cache")
@@ -0,0 +1,23 @@
+"""rolling chat summary on tickets
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("tickets", sa.Column("chat_summary", sa.Text()))
+    op.add_column("tickets", sa.Column("chat_summary_upto", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    op.drop_column("tickets", "chat_summary_upto")
+    op.drop_column("tickets", "chat_summary")
@@ -0,0 +1,44 @@
+"""full-text search vectors and GIN indexes on tickets and chat messages
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+# Выражения совпадают с app.models.ticket.TICKET_SEARCH_VECTOR и ChatMessage.search_vector;
+# генерируемая STORED-колонка заполняется для существующих строк при добавлении
+TICKET_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(full_name, '') || ' ' || coalesce(company, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, coalesce(summary, '')), 'B')"
+    " || setweight(to_tsvector('russian'::regconfig, coalesce(original_email, '')), 'C')"
+)
+CHAT_SEARCH_VECTOR = "to_tsvector('russian'::regconfig, text)"
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tickets",
+        sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(TICKET_SEARCH_VECTOR, persisted=True)),
+    )
+    op.create_index("ix_tickets_search_vector", "tickets", ["search_vector"], postgresql_using="gin")
+
+    op.add_column(
+        "chat_messages",
+        sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(CHAT_SEARCH_VECTOR, persisted=True)),
+    )
+    op.create_index("ix_chat_messages_search_vector", "chat_messages", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chat_messages_search_vector", table_name="chat_messages")
+    op.drop_column("chat_messages", "search_vector")
+    op.drop_index("ix_tickets_search_vector", table_name="tickets")
+    op.drop_column("tickets", "search_vector")
@@ -0,0 +1,32 @@
+"""GIN indexes for lookups by device serial and model code
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_tickets_device_serials", "tickets", ["device_serials"], postgresql_using="gin")
+
+    # Код модели — первые три цифры заводского номера. IMMUTABLE, чтобы по функции можно было построить индекс
+    op.execute("""
+        CREATE FUNCTION serial_model_codes(serials varchar[]) RETURNS text[]
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT array_agg(DISTINCT left(s, 3)) FROM unnest(serials) AS s $$
+    """)
+    op.execute(
+        "CREATE INDEX ix_tickets_serial_model_codes ON tickets USING gin (serial_model_codes(device_serials))"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tickets_serial_model_codes", table_name="tickets")
+    op.execute("DROP FUNCTION serial_model_codes(varchar[])")
+    op.drop_index("ix_tickets_device_serials", table_name="tickets")
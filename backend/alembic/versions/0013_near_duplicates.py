@@ -0,0 +1,33 @@
+"""MinHash signatures, LSH band keys and duplicate link on tickets
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("tickets", sa.Column("minhash", ARRAY(sa.Integer())))
+    op.add_column("tickets", sa.Column("lsh_bands", ARRAY(sa.BigInteger())))
+    op.add_column(
+        "tickets",
+        sa.Column("duplicate_of", sa.Integer(), sa.ForeignKey("tickets.id", ondelete="SET NULL")),
+    )
+    op.create_index("ix_tickets_lsh_bands", "tickets", ["lsh_bands"], postgresql_using="gin")
+    op.create_index("ix_tickets_duplicate_of", "tickets", ["duplicate_of"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tickets_duplicate_of", table_name="tickets")
+    op.drop_index("ix_tickets_lsh_bands", table_name="tickets")
+    op.drop_column("tickets", "duplicate_of")
+    op.drop_column("tickets", "lsh_bands")
+    op.drop_column("tickets", "minhash")
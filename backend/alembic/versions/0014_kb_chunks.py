@@ -0,0 +1,48 @@
+"""pgvector chunks of knowledge base files for retrieval
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+EMBEDDING_DIM = 384
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    op.add_column("kb_files", sa.Column("content_hash", sa.String(64)))
+    op.add_column("kb_files", sa.Column("indexed_at", sa.DateTime(timezone=True)))
+    op.add_column("kb_files", sa.Column("index_error", sa.Text()))
+
+    op.create_table(
+        "kb_chunks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("file_id", sa.Integer(), sa.ForeignKey("kb_files.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("chunk_idx", sa.Integer(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("embedding", Vector(EMBEDDING_DIM), nullable=False),
+    )
+    op.create_index("ix_kb_chunks_file_id", "kb_chunks", ["file_id"])
+    # HNSW обновляется инкрементально — переиндексация файла не требует перестройки индекса
+    op.create_index(
+        "ix_kb_chunks_embedding", "kb_chunks", ["embedding"],
+        postgresql_using="hnsw", postgresql_ops={"embedding": "vector_cosine_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_kb_chunks_embedding", table_name="kb_chunks")
+    op.drop_index("ix_kb_chunks_file_id", table_name="kb_chunks")
+    op.drop_table("kb_chunks")
+    op.drop_column("kb_files", "index_error")
+    op.drop_column("kb_files", "indexed_at")
+    op.drop_column("kb_files", "content_hash")
@@ -0,0 +1,57 @@
+"""NOTIFY triggers for real-time ticket and chat events
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # В payload только тип и id: строку слушатель дочитывает сам (лимит NOTIFY — 8000 байт).
+    # Уведомление уходит при COMMIT; одинаковые payload в одной транзакции Postgres склеивает
+    op.execute("""
+        CREATE FUNCTION notify_realtime_event() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            PERFORM pg_notify(
+                'realtime_events',
+                json_build_object('type', TG_ARGV[0], 'id', (to_jsonb(NEW) ->> TG_ARGV[1])::int)::text
+            );
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER tickets_notify_insert AFTER INSERT ON tickets
+        FOR EACH ROW EXECUTE FUNCTION notify_realtime_event('ticket', 'id')
+    """)
+    op.execute("""
+        CREATE TRIGGER tickets_notify_update AFTER UPDATE ON tickets
+        FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE FUNCTION notify_realtime_event('ticket', 'id')
+    """)
+    op.execute("""
+        CREATE TRIGGER chat_messages_notify_insert AFTER INSERT ON chat_messages
+        FOR EACH ROW EXECUTE FUNCTION notify_realtime_event('chat', 'id')
+    """)
+    # Смена статуса доставки письма — обновление delivery_status у сообщения чата
+    op.execute("""
+        CREATE TRIGGER outbox_notify_status AFTER UPDATE OF status ON outbox
+        FOR EACH ROW WHEN (NEW.chat_message_id IS NOT NULL AND OLD.status IS DISTINCT FROM NEW.status)
+        EXECUTE FUNCTION notify_realtime_event('chat', 'chat_message_id')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER outbox_notify_status ON outbox")
+    op.execute("DROP TRIGGER chat_messages_notify_insert ON chat_messages")
+    op.execute("DROP TRIGGER tickets_notify_update ON tickets")
+    op.execute("DROP TRIGGER tickets_notify_insert ON tickets")
+    op.execute("DROP FUNCTION notify_realtime_event()")
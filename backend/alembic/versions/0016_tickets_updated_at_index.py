@@ -0,0 +1,20 @@
+"""Index on tickets.updated_at for delta sync
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_tickets_updated_at_id", "tickets", ["updated_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tickets_updated_at_id", table_name="tickets")
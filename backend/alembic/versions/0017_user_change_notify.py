@@ -0,0 +1,47 @@
+"""NOTIFY on user changes to invalidate cached principals
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0017"
+down_revision = "0016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Тот же канал, что и у событий дашборда: слушатель каждого API-процесса сбрасывает кэш пользователя
+    op.execute("""
+        CREATE FUNCTION notify_user_changed() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            user_id int;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                user_id := (to_jsonb(OLD) ->> TG_ARGV[0])::int;
+            ELSE
+                user_id := (to_jsonb(NEW) ->> TG_ARGV[0])::int;
+            END IF;
+            PERFORM pg_notify('realtime_events', json_build_object('type', 'user', 'id', user_id)::text);
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER users_notify_change AFTER UPDATE OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION notify_user_changed('id')
+    """)
+    op.execute("""
+        CREATE TRIGGER user_telegram_ids_notify_change AFTER INSERT OR UPDATE OR DELETE ON user_telegram_ids
+        FOR EACH ROW EXECUTE FUNCTION notify_user_changed('user_id')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER user_telegram_ids_notify_change ON user_telegram_ids")
+    op.execute("DROP TRIGGER users_notify_change ON users")
+    op.execute("DROP FUNCTION notify_user_changed()")
@@ -6,6 +6,10 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "change_me_in_production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 8  # 8 часов
+    AUTH_CACHE_TTL: int = 30             # сколько секунд пользователь из токена живёт в кэше процесса
+    AUTH_CACHE_SIZE: int = 1000
+    AUTH_BCRYPT_ROUNDS: int = 12         # стоимость bcrypt; хэши с меньшей перехэшируются при входе
+    AUTH_HASH_WORKERS: int = 2           # потоков под bcrypt на процесс
 
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
     BOT_SECRET: str = "change_me_bot_secret"
@@ -20,8 +24,101 @@ class Settings(BaseSettings):
     IMAP_PORT: int = 993
     SMTP_HOST: str = ""
     SMTP_PORT: int = 587
+    SMTP_POOL_SIZE: int = 4
+    SMTP_TIMEOUT: int = 30
+    SMTP_KEEPALIVE_INTERVAL: int = 60     # NOOP простаивающим соединениям
+    SMTP_IDLE_TIMEOUT: int = 300          # дольше без писем — закрываем соединение
     EMAIL_USER: str = ""
     EMAIL_PASSWORD: str = ""
+    EMAIL_PROCESS_CONCURRENCY: int = 8   # сколько писем из одной пачки обрабатываются одновременно
+    EMAIL_INGEST_BATCH: int = 100        # новых писем на один INSERT заявок
+    NEAR_DUP_ENABLED: bool = True        # почти-дубликаты писем не получают отдельного AI-анализа
+    NEAR_DUP_THRESHOLD: float = 0.8      # оценка сходства по Жаккару (MinHash)
+    NEAR_DUP_WINDOW_DAYS: int = 14       # с заявками старше дубликаты не ищем
+    IMAP_IDLE_TIMEOUT: int = 25 * 60     # RFC 2177: переоткрывать IDLE раньше 29 минут
+    IMAP_FETCH_BATCH: int = 50           # UID на один UID FETCH a:b
+    IMAP_FETCH_MODE: str = "structure"   # structure — заголовки + текст, вложения по запросу; full — RFC822 целиком
+    IMAP_MAX_BODY_BYTES: int = 256 * 1024  # больше этого из текстовой части не качаем
+    IMAP_TIMEOUT: int = 30
+    IMAP_RECONNECT_MAX_DELAY: int = 300
+
+    # Фоновые задачи: отдельный процесс app.worker, опрос IMAP — только в выбранном лидере
+    API_RUN_WORKERS: bool = False          # True — запускать их и в процессе API (один uvicorn без воркера)
+    LEADER_RETRY_SECONDS: float = 10.0     # как часто резервная копия пробует стать лидером
+    LEADER_CHECK_SECONDS: float = 5.0      # проверка соединения, на котором держится лок лидера
+
+    # Outbox писем клиентам
+    OUTBOX_BATCH_SIZE: int = 20
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_BACKOFF_SECONDS: float = 15.0
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_LOCK_TIMEOUT: int = 300
+
+    # Пагинация списка заявок
+    TICKETS_PAGE_SIZE: int = 50
+    TICKETS_PAGE_SIZE_MAX: int = 200
+    TICKETS_SYNC_OVERLAP_SECONDS: int = 5   # запас под транзакции, закоммиченные позже своего updated_at
+    SEARCH_PAGE_SIZE: int = 20
+    SEARCH_PAGE_SIZE_MAX: int = 100
+    EXPORT_TIMEZONE: str = "Europe/Moscow"   # даты в выгрузке CSV/XLSX
+
+    # Push-события дашборду (SSE /api/tickets/events, источник — LISTEN/NOTIFY)
+    EVENTS_HEARTBEAT: float = 20.0         # комментарий-пинг, чтобы прокси не рвали простаивающий поток
+    EVENTS_QUEUE_SIZE: int = 500           # событий в очереди клиента; переполнил — получает resync
+    EVENTS_BATCH_SIZE: int = 200           # уведомлений на одно чтение строк из БД
+
+    # Очередь AI-анализа
+    AI_WORKERS: int = 4
+    AI_JOB_MAX_ATTEMPTS: int = 5
+    AI_JOB_BACKOFF_SECONDS: float = 10.0   # база экспоненциальной задержки между попытками
+    AI_JOB_POLL_INTERVAL: float = 2.0      # пауза воркера, когда очередь пуста
+    AI_JOB_LOCK_TIMEOUT: int = 300         # running дольше этого — воркер умер, задачу забираем заново
+
+    # Массовый переанализ заявок (scripts/reanalyze_tickets.py)
+    AI_BATCH_SIZE: int = 8                 # коротких заявок в одном запросе к LLM
+    AI_BATCH_MAX_CHARS: int = 1500         # длиннее — анализируется отдельным запросом
+    AI_BACKFILL_LANES: int = 4             # параллельных запросов
+    AI_BACKFILL_CHUNK: int = 200           # заявок на одно чтение и один bulk UPDATE
+
+    # Общий клиент LLM: провайдер, лимиты, повторы, circuit breaker
+    LLM_PROVIDER: str = "groq"             # groq | fake (офлайн-заглушка для нагрузочных тестов)
+    LLM_ANALYSIS_MODEL: str = "llama-3.3-70b-versatile"
+    LLM_CHAT_MODEL: str = "llama-3.3-70b-versatile"
+    LLM_MAX_CONCURRENCY: int = 8           # одновременных запросов к провайдеру на процесс
+    LLM_REQUESTS_PER_MINUTE: int = 30      # собственный лимит; заголовки x-ratelimit-* его ужесточают
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_SECONDS: float = 1.0
+    LLM_TIMEOUT: float = 60.0
+    LLM_BREAKER_FAILURES: int = 5          # подряд ошибок провайдера до размыкания
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    LLM_FAKE_LATENCY_MS: float = 800.0     # медиана задержки fake-провайдера
+    LLM_FAKE_LATENCY_DIST: str = "lognormal"  # lognormal | exponential | uniform | fixed
+    LLM_FAKE_LATENCY_SIGMA: float = 0.5
+    LLM_FAKE_FAILURE_RATE: float = 0.0     # доля ответов 5xx
+    LLM_FAKE_RATE_LIMIT_RATE: float = 0.0  # доля ответов 429
+    LLM_FAKE_SEED: int | None = None
+
+    # Контекст AI-чата (в токенах, оценка по длине текста)
+    CHAT_HISTORY_TOKENS: int = 1500    # последние реплики, остальное сворачивается в summary
+    CHAT_CONTEXT_TOKENS: int = 1000    # текст исходного обращения
+    CHAT_SUMMARY_TOKENS: int = 300
+
+    # База знаний для RAG: извлечение текста, эмбеддинги на CPU, pgvector
+    KB_RAG_ENABLED: bool = True
+    KB_FILES_DIR: str = "kb_files"         # относительные KbFile.file_path считаются от этого каталога
+    KB_EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    KB_CHUNK_TOKENS: int = 200
+    KB_TOP_K: int = 4
+    KB_MAX_DISTANCE: float = 0.6           # косинусное расстояние; дальше — фрагмент не по теме
+    KB_CONTEXT_TOKENS: int = 600           # бюджет найденных фрагментов в промпте
+    KB_INDEX_INTERVAL: int = 600           # как часто проверять файлы на изменения
+    KB_MODEL_RETRY_SECONDS: int = 600      # после ошибки загрузки модели — без RAG до следующей попытки
+    KB_VERSION_CHECK_SECONDS: int = 60     # как часто перечитывать отпечаток индекса для ключа кэша анализа
+
+    # Кэш AI-анализа: LRU в памяти процесса + таблица в Postgres
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MEMORY_SIZE: int = 1000
+    AI_CACHE_TTL: int = 7 * 24 * 3600
 
     @property
     def cors_origins_list(self) -> list[str]:
@@ -12,6 +12,11 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def asyncpg_dsn() -> str:
+    """DATABASE_URL for a bare asyncpg connection (LISTEN, session-level advisory locks) outside the pool."""
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -7,22 +7,28 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.routers import auth, tickets, knowledge_base, telegram
-from app.services.email_service import start_email_polling
+from app.services.smtp_pool import smtp_pool
+from app.services.realtime import run_event_listener
+from app.services import ai_cache
+from app.services.ai_service import llm
+from app.worker import background_tasks, stop_tasks
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task = asyncio.create_task(start_email_polling(interval=60))
+    # Почта, очередь AI, outbox и индексация базы знаний — в отдельном процессе (python -m app.worker),
+    # чтобы API можно было масштабировать копиями без двойного опроса IMAP
+    smtp_pool.start()
+    tasks = [asyncio.create_task(run_event_listener())]
+    if settings.API_RUN_WORKERS:
+        tasks += background_tasks()
     try:
         yield
     finally:
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        await stop_tasks(tasks)
+        await smtp_pool.close()
 
 
 app = FastAPI(
@@ -49,4 +55,4 @@ app.include_router(telegram.router)
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "ai_cache": ai_cache.stats(), "llm": llm.metrics()}
@@ -1,6 +1,11 @@
 from app.models.user import User
 from app.models.ticket import Ticket
 from app.models.chat_message import ChatMessage
-from app.models.knowledge_base import KbSection, KbFile
+from app.models.knowledge_base import KbSection, KbFile, KbChunk
+from app.models.ai_job import AiJob
+from app.models.mailbox_state import MailboxState
+from app.models.email_attachment import EmailAttachment
+from app.models.outbox import OutboxMessage
+from app.models.ai_cache import AiCacheEntry
 
-__all__ = ["User", "Ticket", "ChatMessage", "KbSection", "KbFile"]
+__all__ = ["User", "Ticket", "ChatMessage", "KbSection", "KbFile", "KbChunk", "AiJob", "MailboxState", "EmailAttachment", "OutboxMessage", "AiCacheEntry"]
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class AiCacheEntry(Base):
+    """Закэшированный результат AI-анализа. Ключ — хэш нормализованного текста, модели, версии промпта и температуры."""
+    __tablename__ = "ai_analysis_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    hits: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import String, Text, DateTime, ForeignKey, Boolean, Index, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+
+
+class AiJob(Base):
+    """Задача AI-анализа заявки. Очередь живёт в Postgres и переживает рестарт."""
+    __tablename__ = "ai_jobs"
+    __table_args__ = (
+        # Выборка воркером: WHERE status = ... AND run_after <= now() ORDER BY run_after
+        Index("ix_ai_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending|running|done|dead
+    # Заявка из почты: после анализа добавить ответ бота в чат и отправить его клиенту
+    reply_to_client: Mapped[bool] = mapped_column(Boolean, default=False)
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[str | None] = mapped_column(Text)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    ticket: Mapped["Ticket"] = relationship("Ticket")
@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime, ForeignKey, func
+from sqlalchemy import String, Text, DateTime, ForeignKey, Index, Computed, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -7,11 +8,28 @@ from app.database import Base
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     ticket_id: Mapped[int] = mapped_column(ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
     role: Mapped[str] = mapped_column(String(10), nullable=False)   # user | bot
     text: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('russian'::regconfig, text)", persisted=True),
+        deferred=True,
+    )
 
     ticket: Mapped["Ticket"] = relationship("Ticket", back_populates="chat_messages")
+    # selectin: статус доставки нужен в каждом ответе API и подгружается и при refresh()
+    outbox: Mapped["OutboxMessage | None"] = relationship(
+        "OutboxMessage", back_populates="chat_message", uselist=False, lazy="selectin"
+    )
+
+    @property
+    def delivery_status(self) -> str | None:
+        """Статус письма клиенту с этим сообщением: pending|sending|sent|failed, None — не отправлялось."""
+        return self.outbox.status if self.outbox else None
@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import String, Text, DateTime, ForeignKey, BigInteger, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+
+
+class EmailAttachment(Base):
+    """Ссылка на вложение в IMAP-ящике. Содержимое скачивается только по запросу оператора."""
+    __tablename__ = "email_attachments"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    ticket_id: Mapped[int] = mapped_column(ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    mailbox: Mapped[str] = mapped_column(String(255), nullable=False)
+    uidvalidity: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    uid: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    part: Mapped[str] = mapped_column(String(50), nullable=False)      # номер MIME-части, напр. "2" или "1.3"
+    filename: Mapped[str | None] = mapped_column(Text)
+    mime_type: Mapped[str | None] = mapped_column(String(100))
+    encoding: Mapped[str] = mapped_column(String(30), default="7bit")  # Content-Transfer-Encoding
+    size: Mapped[int | None] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    ticket: Mapped["Ticket"] = relationship("Ticket")
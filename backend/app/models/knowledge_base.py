@@ -1,9 +1,13 @@
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime, ForeignKey, BigInteger, func
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import String, Text, DateTime, ForeignKey, BigInteger, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
+# Размерность эмбеддингов KB_EMBEDDING_MODEL; смена модели требует миграции и переиндексации
+EMBEDDING_DIM = 384
+
 
 class KbSection(Base):
     __tablename__ = "kb_sections"
@@ -29,5 +33,32 @@ class KbFile(Base):
     uploaded_by: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+    # Индексация для RAG (app.services.kb_index): sha256 содержимого на момент последней индексации
+    content_hash: Mapped[str | None] = mapped_column(String(64))
+    indexed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    index_error: Mapped[str | None] = mapped_column(Text)
+
     section: Mapped["KbSection"] = relationship("KbSection", back_populates="files")
     uploader: Mapped["User | None"] = relationship("User", back_populates="kb_files")
+    chunks: Mapped[list["KbChunk"]] = relationship(
+        "KbChunk", back_populates="file", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+class KbChunk(Base):
+    """Фрагмент текста файла базы знаний с эмбеддингом для поиска ближайших соседей."""
+    __tablename__ = "kb_chunks"
+    __table_args__ = (
+        Index(
+            "ix_kb_chunks_embedding", "embedding",
+            postgresql_using="hnsw", postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    file_id: Mapped[int] = mapped_column(ForeignKey("kb_files.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_idx: Mapped[int] = mapped_column(nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    embedding: Mapped[list[float]] = mapped_column(Vector(EMBEDDING_DIM), nullable=False)
+
+    file: Mapped["KbFile"] = relationship("KbFile", back_populates="chunks")
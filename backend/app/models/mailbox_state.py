@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, BigInteger, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class MailboxState(Base):
+    """Позиция синхронизации IMAP-ящика: до какого UID письма уже разобраны."""
+    __tablename__ = "mailbox_state"
+
+    mailbox: Mapped[str] = mapped_column(String(255), primary_key=True)
+    uidvalidity: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_uid: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,12 +1,39 @@
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime, ForeignKey, ARRAY, func
+from sqlalchemy import String, Text, DateTime, ForeignKey, ARRAY, BigInteger, Integer, Index, Computed, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
+TICKET_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(full_name, '') || ' ' || coalesce(company, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, coalesce(summary, '')), 'B')"
+    " || setweight(to_tsvector('russian'::regconfig, coalesce(original_email, '')), 'C')"
+)
+
+
+def serial_model_codes(serials):
+    """SQL: коды моделей (первые три цифры) заводских номеров. Функция создана миграцией 0012
+    и проиндексирована — в запросах использовать именно это выражение, иначе индекс не сработает."""
+    return func.serial_model_codes(serials, type_=ARRAY(Text))
+
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Keyset-пагинация списка: ORDER BY date_received DESC, id DESC
+        Index("ix_tickets_date_received_id", "date_received", "id"),
+        # Дельта-синхронизация: updated_at > :since ORDER BY updated_at, id
+        Index("ix_tickets_updated_at_id", "updated_at", "id"),
+        Index("ix_tickets_search_vector", "search_vector", postgresql_using="gin"),
+        # Поиск по заводскому номеру: device_serials @> ARRAY[...]
+        Index("ix_tickets_device_serials", "device_serials", postgresql_using="gin"),
+        # Поиск по модели: serial_model_codes(device_serials) @> ARRAY[...]
+        Index("ix_tickets_serial_model_codes", func.serial_model_codes(text("device_serials")),
+              postgresql_using="gin"),
+        # Кандидаты в почти-дубликаты: lsh_bands && ARRAY[...]
+        Index("ix_tickets_lsh_bands", "lsh_bands", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -28,6 +55,23 @@ class Ticket(Base):
     original_email: Mapped[str | None] = mapped_column(Text)
     ai_response: Mapped[str | None] = mapped_column(Text)
 
+    # Полнотекстовый поиск: ФИО и организация весомее краткого содержания, оно — текста письма
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(TICKET_SEARCH_VECTOR, persisted=True),
+        deferred=True,
+    )
+
+    # Почти-дубликаты (app.services.near_dup): MinHash текста письма и ключи LSH-полос.
+    # Дубликат ссылается на исходную заявку и не получает собственного AI-анализа
+    minhash: Mapped[list[int] | None] = mapped_column(ARRAY(Integer), deferred=True)
+    lsh_bands: Mapped[list[int] | None] = mapped_column(ARRAY(BigInteger), deferred=True)
+    duplicate_of: Mapped[int | None] = mapped_column(ForeignKey("tickets.id", ondelete="SET NULL"), index=True)
+
+    # Свёртка старой части чата для промпта AI: summary сообщений с id <= chat_summary_upto
+    chat_summary: Mapped[str | None] = mapped_column(Text)
+    chat_summary_upto: Mapped[int] = mapped_column(default=0)
+
     # Статус
     status: Mapped[str] = mapped_column(String(20), default="open", index=True)  # open|in_progress|closed
 
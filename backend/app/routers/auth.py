@@ -3,9 +3,12 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.schemas.auth import LoginRequest, TokenResponse, UserOut, UserUpdate
-from app.services.auth_service import authenticate, create_access_token, decode_token
+from app.services.auth_service import (
+    Principal, authenticate, cache_principal, create_access_token, decode_token, get_cached_principal,
+    invalidate_principal,
+)
 from app.models.user import User, UserTelegramId
 from sqlalchemy import select, delete
 
@@ -13,30 +16,36 @@ router = APIRouter(prefix="/api/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def _user_to_out(user: User) -> UserOut:
+def _user_to_out(user: Principal) -> UserOut:
     return UserOut(
         id=user.id,
         email=user.email,
         full_name=user.full_name,
         role=user.role,
-        telegram_ids=[t.telegram_id for t in user.telegram_ids],
+        telegram_ids=list(user.telegram_ids),
     )
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db),
-) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Principal from the bearer token; the DB is read at most once per AUTH_CACHE_TTL per token."""
     user_id = decode_token(token)
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Недействительный токен")
-    result = await db.execute(
-        select(User).options(selectinload(User.telegram_ids)).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не найден")
-    return user
+    principal = get_cached_principal(user_id, token)
+    if principal is not None:
+        return principal
+
+    # Своя сессия, а не Depends(get_db): при попадании в кэш соединение с БД не нужно вовсе
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(User).options(selectinload(User.telegram_ids)).where(User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не найден")
+        principal = Principal.from_user(user)
+    cache_principal(token, principal)
+    return principal
 
 
 @router.post("/login", response_model=TokenResponse)
@@ -48,24 +57,30 @@ async def login(payload: OAuth2PasswordRequestForm = Depends(), db: AsyncSession
 
 
 @router.get("/me", response_model=UserOut)
-async def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: Principal = Depends(get_current_user)):
     return _user_to_out(current_user)
 
 
 @router.patch("/me", response_model=UserOut)
 async def update_me(
     payload: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    user = (await db.execute(
+        select(User).options(selectinload(User.telegram_ids)).where(User.id == current_user.id)
+    )).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не найден")
     if payload.telegram_ids is not None:
         await db.execute(
             delete(UserTelegramId)
-            .where(UserTelegramId.user_id == current_user.id)
+            .where(UserTelegramId.user_id == user.id)
             .execution_options(synchronize_session=False)
         )
         for tg_id in payload.telegram_ids:
-            db.add(UserTelegramId(user_id=current_user.id, telegram_id=tg_id))
+            db.add(UserTelegramId(user_id=user.id, telegram_id=tg_id))
     await db.commit()
-    await db.refresh(current_user, attribute_names=["telegram_ids"])
-    return _user_to_out(current_user)
+    invalidate_principal(user.id)
+    await db.refresh(user, attribute_names=["telegram_ids"])
+    return _user_to_out(Principal.from_user(user))
@@ -7,7 +7,7 @@ from app.database import get_db
 from app.models.knowledge_base import KbSection, KbFile
 from app.schemas.knowledge_base import KbSectionOut
 from app.routers.auth import get_current_user
-from app.models.user import User
+from app.services.auth_service import Principal
 
 router = APIRouter(prefix="/api/kb", tags=["knowledge_base"])
 
@@ -15,7 +15,7 @@ router = APIRouter(prefix="/api/kb", tags=["knowledge_base"])
 @router.get("/sections", response_model=list[KbSectionOut])
 async def list_sections(
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     result = await db.execute(
         select(KbSection)
@@ -29,7 +29,7 @@ async def list_sections(
 async def get_section(
     section_id: int,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     result = await db.execute(
         select(KbSection)
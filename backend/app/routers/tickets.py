@@ -1,79 +1,414 @@
+import asyncio
+import base64
+import hashlib
+import html
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 logger = logging.getLogger(__name__)
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, tuple_, func, case, literal, literal_column, union_all, Integer
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, load_only
 
+from app.config import settings
 from app.database import get_db, AsyncSessionLocal
-from app.models.ticket import Ticket
+from app.models.ticket import Ticket, serial_model_codes
 from app.models.chat_message import ChatMessage
-from app.schemas.ticket import TicketOut, TicketUpdate, TicketCreate
+from app.models.ai_job import AiJob
+from app.models.email_attachment import EmailAttachment
+from app.models.outbox import OutboxMessage
+from app.schemas.ticket import (
+    TicketOut, TicketUpdate, TicketCreate, TicketPage, TicketListItem, AttachmentOut,
+    TicketSearchHit, TicketSearchPage, TicketStats,
+)
 from app.schemas.chat import ChatMessageOut, ChatMessageCreate
 from app.routers.auth import get_current_user
-from app.models.user import User
-from app.services.ai_service import analyze_ticket_with_ai, generate_chat_reply
-from app.services.email_service import send_email_response, send_chat_message_to_client
+from app.services.auth_service import Principal
+from app.services.ai_service import CHAT_ERROR_REPLY, generate_chat_reply, stream_chat_reply
+from app.services.chat_context import build_chat_history, fold_chat_history, ticket_context
+from app.services.email_service import send_email_response
+from app.services.outbox import queue_chat_message_email
+from app.services.imap_listener import fetch_attachment
+from app.services import realtime, ticket_export
 
 router = APIRouter(prefix="/api/tickets", tags=["tickets"])
 
-async def process_ticket_ai(ticket_id: int, ticket_text: str):
-    """Background task to analyze ticket with AI and update DB."""
-    ai_result = await analyze_ticket_with_ai(ticket_text)
-    
-    async with AsyncSessionLocal() as session:
-        ticket = await session.get(Ticket, ticket_id)
-        if ticket:
-            ticket.sentiment = ai_result.get("sentiment")
-            ticket.category = ai_result.get("category")
-            ticket.ai_response = ai_result.get("draft_response")
-            ticket.full_name = ticket.full_name or ai_result.get("full_name")
-            ticket.company = ticket.company or ai_result.get("company")
-            ticket.phone = ticket.phone or ai_result.get("phone")
-            ticket.device_serials = ticket.device_serials or ai_result.get("device_serials") or []
-            ticket.device_type = ticket.device_type or ai_result.get("device_type")
-            ticket.summary = ticket.summary or ai_result.get("summary")
-            await session.commit()
+# ── Список заявок ─────────────────────────────────────
+# Колонки для списка: тяжёлые original_email / ai_response отдаются только в get_ticket
+_LIST_COLUMNS = (
+    Ticket.id, Ticket.date_received, Ticket.full_name, Ticket.company, Ticket.phone,
+    Ticket.email, Ticket.device_serials, Ticket.device_type, Ticket.sentiment,
+    Ticket.category, Ticket.summary, Ticket.status, Ticket.assigned_to,
+    Ticket.duplicate_of, Ticket.created_at, Ticket.updated_at,
+)
 
 
-# ── Список заявок ─────────────────────────────────────
-@router.get("", response_model=list[TicketOut])
-async def list_tickets(
-    status: str | None = None,
-    sentiment: str | None = None,
-    category: str | None = None,
-    db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
-):
-    q = select(Ticket).order_by(desc(Ticket.date_received))
+def _encode_cursor(date_received: datetime, ticket_id: int) -> str:
+    raw = f"{date_received.isoformat()}|{ticket_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        date_part, id_part = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+# ── Условные GET: ETag / Last-Modified ────────────────
+def _etag(*parts) -> str:
+    return '"' + hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest() + '"'
+
+
+def _is_fresh(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """RFC 9110: If-None-Match, если есть, важнее If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Last-Modified с точностью до секунды
+    return last_modified.replace(microsecond=0) <= since
+
+
+def _cache_headers(etag: str, last_modified: datetime | None) -> dict[str, str]:
+    # no-cache: браузер хранит ответ, но каждый раз перепроверяет его условным запросом
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _not_modified(etag: str, last_modified: datetime | None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag, last_modified))
+
+
+def _filtered(status: str | None, sentiment: str | None, category: str | None):
+    q = select(Ticket)
     if status:
         q = q.where(Ticket.status == status)
     if sentiment:
         q = q.where(Ticket.sentiment == sentiment)
     if category:
         q = q.where(Ticket.category == category)
-    result = await db.execute(q)
-    return result.scalars().all()
+    return q
+
+
+async def _keyset_page(
+    db: AsyncSession,
+    request: Request,
+    response: Response,
+    q,
+    cursor: str | None,
+    limit: int,
+    updated_since: datetime | None = None,
+) -> TicketPage | Response:
+    """Keyset-пагинация по (date_received, id) от новых к старым, с updated_since — по (updated_at, id) от старых.
+
+    Сначала читаются только id и updated_at страницы: по ним считается ETag, и при
+    совпадении с If-None-Match тяжёлые колонки не читаются и не сериализуются вовсе.
+    """
+    limit = min(limit, settings.TICKETS_PAGE_SIZE_MAX)
+    if updated_since is None:
+        q = q.order_by(desc(Ticket.date_received), desc(Ticket.id))
+        if cursor:
+            q = q.where(tuple_(Ticket.date_received, Ticket.id) < _decode_cursor(cursor))
+    else:
+        q = q.where(Ticket.updated_at > updated_since).order_by(Ticket.updated_at, Ticket.id)
+        if cursor:
+            q = q.where(tuple_(Ticket.updated_at, Ticket.id) > _decode_cursor(cursor))
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = (await db.execute(
+        q.with_only_columns(Ticket.id, Ticket.date_received, Ticket.updated_at).limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.date_received if updated_since is None else last.updated_at, last.id)
+    last_modified = max((r.updated_at for r in rows), default=None)
+    # Граница следующей дельты — от самих строк, а не от часов: ответ (и ETag) детерминирован
+    sync_since = updated_since
+    if last_modified is not None:
+        sync_since = last_modified - timedelta(seconds=settings.TICKETS_SYNC_OVERLAP_SECONDS)
+
+    etag = _etag("tickets", next_cursor, *(f"{r.id}:{r.updated_at.isoformat()}" for r in rows))
+    if _is_fresh(request, etag, last_modified):
+        return _not_modified(etag, last_modified)
+    response.headers.update(_cache_headers(etag, last_modified))
+
+    ids = [r.id for r in rows]
+    tickets = {}
+    if ids:
+        result = await db.execute(select(Ticket).options(load_only(*_LIST_COLUMNS)).where(Ticket.id.in_(ids)))
+        tickets = {t.id: t for t in result.scalars()}
+    return TicketPage(
+        items=[TicketListItem.model_validate(tickets[i]) for i in ids if i in tickets],
+        next_cursor=next_cursor,
+        sync_since=sync_since,
+    )
+
+
+@router.get("", response_model=TicketPage)
+async def list_tickets(
+    request: Request,
+    response: Response,
+    status: str | None = None,
+    sentiment: str | None = None,
+    category: str | None = None,
+    cursor: str | None = None,
+    updated_since: datetime | None = None,
+    limit: int = Query(default=settings.TICKETS_PAGE_SIZE, ge=1),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Список заявок; с `updated_since` — только изменённые после этого момента.
+
+    Клиент хранит `sync_since` из ответа и передаёт его в следующий `updated_since`.
+    Заявки на стыке окна TICKETS_SYNC_OVERLAP_SECONDS могут прийти повторно — их просто заменяют по id.
+    """
+    q = _filtered(status, sentiment, category)
+    return await _keyset_page(db, request, response, q, cursor, limit, updated_since)
+
+
+# ── Статистика ────────────────────────────────────────
+@router.get("/stats", response_model=TicketStats)
+async def ticket_stats(
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Счётчики по статусу, категории и тональности — один GROUP BY, несколько десятков строк."""
+    category = func.coalesce(Ticket.category, "other")
+    sentiment = func.coalesce(Ticket.sentiment, "other")
+    result = await db.execute(
+        select(Ticket.status, category, sentiment, func.count()).group_by(Ticket.status, category, sentiment)
+    )
+    stats = TicketStats(total=0, by_status={}, by_category={}, by_sentiment={})
+    for status_, category_, sentiment_, n in result:
+        stats.total += n
+        stats.by_status[status_] = stats.by_status.get(status_, 0) + n
+        stats.by_category[category_] = stats.by_category.get(category_, 0) + n
+        stats.by_sentiment[sentiment_] = stats.by_sentiment.get(sentiment_, 0) + n
+    return stats
+
+
+# ── Выгрузка CSV / XLSX ───────────────────────────────
+@router.get("/export")
+async def export_tickets(
+    fmt: str = Query(default="csv", alias="format", pattern="^(csv|xlsx)$"),
+    status: str | None = None,
+    sentiment: str | None = None,
+    category: str | None = None,
+    _: Principal = Depends(get_current_user),
+):
+    """Все заявки под фильтрами списка, построчно с серверного курсора — память не растёт с числом строк."""
+    q = _filtered(status, sentiment, category).order_by(desc(Ticket.date_received), desc(Ticket.id))
+    filename = ticket_export.export_filename(fmt)
+    if fmt == "xlsx":
+        body = ticket_export.stream_xlsx(q)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = ticket_export.stream_csv(q)
+        media_type = "text/csv; charset=utf-8"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""},
+    )
+
+
+# ── Поиск по заводскому номеру и модели ───────────────
+@router.get("/by-serial/{serial}", response_model=TicketPage)
+async def tickets_by_serial(
+    request: Request,
+    response: Response,
+    serial: str = Path(pattern=r"^\d{9}$"),
+    cursor: str | None = None,
+    limit: int = Query(default=settings.TICKETS_PAGE_SIZE, ge=1),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Все заявки с этим заводским номером (GIN-индекс по device_serials)."""
+    q = select(Ticket).where(Ticket.device_serials.contains([serial]))
+    return await _keyset_page(db, request, response, q, cursor, limit)
+
+
+@router.get("/by-model/{code}", response_model=TicketPage)
+async def tickets_by_model(
+    request: Request,
+    response: Response,
+    code: str = Path(pattern=r"^\d{3}$"),
+    cursor: str | None = None,
+    limit: int = Query(default=settings.TICKETS_PAGE_SIZE, ge=1),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Все заявки по приборам модели `code` — первые три цифры заводского номера."""
+    q = select(Ticket).where(serial_model_codes(Ticket.device_serials).contains([code]))
+    return await _keyset_page(db, request, response, q, cursor, limit)
+
+
+# ── Полнотекстовый поиск ──────────────────────────────
+_SEARCH_CONFIG = literal_column("'russian'::regconfig")
+# Совпадение в переписке весит меньше совпадения в самой заявке
+_CHAT_RANK_WEIGHT = 0.5
+# Маркеры — управляющие символы: текст письма экранируется после ts_headline, а они заменяются на <mark>
+_HEADLINE_OPTIONS = "StartSel=\x02, StopSel=\x03, MaxFragments=2, MaxWords=20, MinWords=8, FragmentDelimiter=\" … \""
+
+
+def _render_snippet(raw: str) -> str:
+    return html.escape(raw).replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+
+@router.get("/search", response_model=TicketSearchPage)
+async def search_tickets(
+    q: str = Query(min_length=2, max_length=200),
+    limit: int = Query(default=settings.SEARCH_PAGE_SIZE, ge=1),
+    offset: int = Query(default=0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Поиск по ФИО, организации, summary, тексту письма и сообщениям чата.
+
+    Совпадения ищутся по GIN-индексам search_vector; ts_headline считается
+    только для строк текущей страницы, а не для всех найденных.
+    """
+    limit = min(limit, settings.SEARCH_PAGE_SIZE_MAX)
+    ts_query = func.websearch_to_tsquery(_SEARCH_CONFIG, q)
+
+    ticket_hits = (
+        select(
+            Ticket.id.label("ticket_id"),
+            func.ts_rank_cd(Ticket.search_vector, ts_query).label("rank"),
+            literal(None, Integer).label("message_id"),
+        )
+        .where(Ticket.search_vector.op("@@")(ts_query))
+    )
+    chat_hits = (
+        select(
+            ChatMessage.ticket_id,
+            (func.ts_rank_cd(ChatMessage.search_vector, ts_query) * _CHAT_RANK_WEIGHT).label("rank"),
+            ChatMessage.id,
+        )
+        .where(ChatMessage.search_vector.op("@@")(ts_query))
+    )
+    hits = union_all(ticket_hits, chat_hits).subquery()
+    # Одна строка на заявку — лучшее из совпадений в ней самой и в её чате
+    best = select(
+        hits.c.ticket_id, hits.c.rank, hits.c.message_id,
+        func.row_number().over(partition_by=hits.c.ticket_id, order_by=desc(hits.c.rank)).label("rn"),
+    ).subquery()
+    top = (
+        select(best.c.ticket_id, best.c.rank, best.c.message_id)
+        .where(best.c.rn == 1)
+        .order_by(desc(best.c.rank), desc(best.c.ticket_id))
+        .limit(limit + 1)
+        .offset(offset)
+        .subquery()
+    )
+
+    snippet_source = case(
+        (top.c.message_id.is_(None), func.coalesce(Ticket.original_email, Ticket.summary, "")),
+        else_=ChatMessage.text,
+    )
+    result = await db.execute(
+        select(
+            Ticket,
+            top.c.rank,
+            top.c.message_id,
+            func.ts_headline(_SEARCH_CONFIG, snippet_source, ts_query, _HEADLINE_OPTIONS).label("snippet"),
+        )
+        .join(top, top.c.ticket_id == Ticket.id)
+        .outerjoin(ChatMessage, ChatMessage.id == top.c.message_id)
+        .options(load_only(*_LIST_COLUMNS))
+        .order_by(desc(top.c.rank), desc(Ticket.id))
+    )
+    rows = result.all()
+
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    return TicketSearchPage(
+        items=[
+            TicketSearchHit(
+                **TicketListItem.model_validate(ticket).model_dump(),
+                rank=rank,
+                matched_in="ticket" if message_id is None else "chat",
+                snippet=_render_snippet(snippet),
+            )
+            for ticket, rank, message_id, snippet in rows
+        ],
+        next_offset=next_offset,
+    )
+
+
+# ── Push-события ──────────────────────────────────────
+@router.get("/events")
+async def ticket_events(_: Principal = Depends(get_current_user)):
+    """Server-Sent Events with ticket and chat deltas.
+
+    `ticket` carries a TicketListItem (created or changed), `chat` a ChatMessageOut
+    (new message or delivery status change), `resync` asks the client to re-fetch
+    its list. The stream holds no DB connection: rows are read once per process by
+    the LISTEN task in services.realtime and fanned out to every subscriber.
+    """
+    queue = realtime.hub.subscribe()
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_HEARTBEAT)
+                except TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(event["type"], event["data"])
+        finally:
+            realtime.hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
 
 
 # ── Создать заявку (вручную / AI-агент) ───────────────
 @router.post("", response_model=TicketOut, status_code=status.HTTP_201_CREATED)
 async def create_ticket(
     payload: TicketCreate,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     ticket = Ticket(**payload.model_dump())
     db.add(ticket)
+    await db.flush()
+
+    # Задача анализа коммитится вместе с заявкой — рестарт её не потеряет
+    if ticket.original_email or ticket.summary:
+        db.add(AiJob(ticket_id=ticket.id))
+
     await db.commit()
     await db.refresh(ticket)
-    
-    ticket_text = ticket.original_email or ticket.summary or ""
-    if ticket_text:
-        background_tasks.add_task(process_ticket_ai, ticket.id, ticket_text)
-        
     return ticket
 
 
@@ -81,13 +416,20 @@ async def create_ticket(
 @router.get("/{ticket_id}", response_model=TicketOut)
 async def get_ticket(
     ticket_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
-    ticket = await db.get(Ticket, ticket_id)
-    if not ticket:
+    # updated_at меняется при любом UPDATE заявки — по нему и валидируем кэш клиента
+    updated_at = await db.scalar(select(Ticket.updated_at).where(Ticket.id == ticket_id))
+    if updated_at is None:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
-    return ticket
+    etag = _etag("ticket", ticket_id, updated_at.isoformat())
+    if _is_fresh(request, etag, updated_at):
+        return _not_modified(etag, updated_at)
+    response.headers.update(_cache_headers(etag, updated_at))
+    return await db.get(Ticket, ticket_id)
 
 
 # ── Обновить заявку ────────────────────────────────────
@@ -96,7 +438,7 @@ async def update_ticket(
     ticket_id: int,
     payload: TicketUpdate,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     ticket = await db.get(Ticket, ticket_id)
     if not ticket:
@@ -113,7 +455,7 @@ async def update_ticket(
 async def send_response(
     ticket_id: int,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     ticket = await db.get(Ticket, ticket_id)
     if not ticket:
@@ -137,17 +479,84 @@ async def send_response(
     return {"success": True, "message": "Ответ отправлен"}
 
 
+# ── Вложения ──────────────────────────────────────────
+@router.get("/{ticket_id}/attachments", response_model=list[AttachmentOut])
+async def list_attachments(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    result = await db.execute(
+        select(EmailAttachment)
+        .where(EmailAttachment.ticket_id == ticket_id)
+        .order_by(EmailAttachment.id)
+    )
+    return result.scalars().all()
+
+
+@router.get("/{ticket_id}/attachments/{attachment_id}")
+async def download_attachment(
+    ticket_id: int,
+    attachment_id: int,
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Attachment content is fetched from IMAP only at this point."""
+    att = await db.get(EmailAttachment, attachment_id)
+    if not att or att.ticket_id != ticket_id:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+
+    try:
+        content = await fetch_attachment(att.mailbox, att.uidvalidity, att.uid, att.part, att.encoding)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except LookupError as exc:
+        raise HTTPException(status_code=410, detail=str(exc))
+
+    filename = quote(att.filename or f"attachment-{att.id}")
+    return Response(
+        content=content,
+        media_type=att.mime_type or "application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"},
+    )
+
+
 # ── Чат заявки ────────────────────────────────────────
 @router.get("/{ticket_id}/chat", response_model=list[ChatMessageOut])
 async def get_chat(
     ticket_id: int,
+    request: Request,
+    response: Response,
+    since_id: int = Query(default=0, ge=0),
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
+    """Сообщения чата; с `since_id` — только новее сообщения с этим id.
+
+    Смена delivery_status уже полученных сообщений через since_id не приходит —
+    её доставляет событие `chat` из /events (или полный запрос без since_id).
+    """
+    # Версия чата: последнее сообщение, их число и статусы писем — без чтения текстов
+    last_id, count = (await db.execute(
+        select(func.max(ChatMessage.id), func.count(ChatMessage.id))
+        .where(ChatMessage.ticket_id == ticket_id, ChatMessage.id > since_id)
+    )).one()
+    delivery = await db.scalar(
+        select(func.string_agg(
+            func.concat(OutboxMessage.chat_message_id, ":", OutboxMessage.status),
+            aggregate_order_by(literal(","), OutboxMessage.chat_message_id),
+        ))
+        .where(OutboxMessage.ticket_id == ticket_id, OutboxMessage.chat_message_id > since_id)
+    )
+    etag = _etag("chat", ticket_id, since_id, last_id, count, delivery)
+    if _is_fresh(request, etag, None):
+        return _not_modified(etag, None)
+    response.headers.update(_cache_headers(etag, None))
+
     result = await db.execute(
         select(ChatMessage)
-        .where(ChatMessage.ticket_id == ticket_id)
-        .order_by(ChatMessage.created_at)
+        .where(ChatMessage.ticket_id == ticket_id, ChatMessage.id > since_id)
+        .order_by(ChatMessage.id)
     )
     return result.scalars().all()
 
@@ -157,7 +566,7 @@ async def add_chat_message(
     ticket_id: int,
     payload: ChatMessageCreate,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     ticket = await db.get(Ticket, ticket_id)
     if not ticket:
@@ -165,50 +574,95 @@ async def add_chat_message(
 
     msg = ChatMessage(ticket_id=ticket_id, role=payload.role, text=payload.text)
     db.add(msg)
+    # Письмо клиенту при ответе оператора — в той же транзакции, отправит диспетчер outbox
+    if payload.role == "operator" and ticket.email:
+        await db.flush()
+        queue_chat_message_email(db, msg, ticket.email)
     await db.commit()
     await db.refresh(msg)
-
-    # Отправить email клиенту при ответе оператора
-    if payload.role == "operator" and ticket.email:
-        try:
-            await send_chat_message_to_client(ticket.email, payload.text, ticket_id)
-        except Exception as exc:
-            logger.warning(f"Failed to email client for ticket {ticket_id}: {exc}")
-
     return msg
 
 
 @router.post("/{ticket_id}/chat/reply", response_model=ChatMessageOut, status_code=status.HTTP_201_CREATED)
 async def ai_chat_reply(
     ticket_id: int,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    _: User = Depends(get_current_user),
+    _: Principal = Depends(get_current_user),
 ):
     """Generate and save an AI bot reply based on the full chat history."""
+    ticket = await _get_ticket_or_404(db, ticket_id)
+    summary, history, needs_fold = await build_chat_history(db, ticket)
+    reply_text = await generate_chat_reply(ticket_context(ticket), history, summary)
+    bot_msg = await _save_bot_reply(db, ticket, reply_text)
+    if needs_fold:
+        # Сворачиваем старые реплики уже после ответа — он их не ждёт
+        background_tasks.add_task(fold_chat_history, ticket_id)
+    return bot_msg
+
+
+@router.post("/{ticket_id}/chat/reply/stream")
+async def ai_chat_reply_stream(
+    ticket_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(get_current_user),
+):
+    """Streaming variant of ai_chat_reply over Server-Sent Events.
+
+    Emits `delta` events with text chunks, then one `done` event with the saved
+    ChatMessageOut. The message is written to chat_messages only after the stream ends.
+    If the provider fails midway, nothing is saved or emailed and the stream ends
+    with an `error` event; the client drops the partial text.
+    """
+    ticket = await _get_ticket_or_404(db, ticket_id)
+    summary, history, needs_fold = await build_chat_history(db, ticket)
+    context = ticket_context(ticket)
+    if needs_fold:
+        # Фоновая задача StreamingResponse выполняется после конца потока
+        background_tasks.add_task(fold_chat_history, ticket_id)
+
+    async def events():
+        chunks = []
+        try:
+            async for delta in stream_chat_reply(context, history, summary):
+                chunks.append(delta)
+                yield _sse("delta", {"text": delta})
+        except Exception:
+            # Оборванный ответ не сохраняем и клиенту не отправляем
+            yield _sse("error", {"detail": CHAT_ERROR_REPLY})
+            return
+
+        # Сессия запроса к этому моменту уже закрыта — сохраняем в своей
+        async with AsyncSessionLocal() as session:
+            bot_msg = await _save_bot_reply(session, ticket, "".join(chunks).strip())
+            yield _sse("done", ChatMessageOut.model_validate(bot_msg).model_dump(mode="json"))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _get_ticket_or_404(db: AsyncSession, ticket_id: int) -> Ticket:
     ticket = await db.get(Ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
+    return ticket
 
-    result = await db.execute(
-        select(ChatMessage)
-        .where(ChatMessage.ticket_id == ticket_id)
-        .order_by(ChatMessage.created_at)
-    )
-    history = [{"role": m.role, "text": m.text} for m in result.scalars().all()]
-
-    ticket_context = ticket.original_email or ticket.summary or ""
-    reply_text = await generate_chat_reply(ticket_context, history)
 
-    bot_msg = ChatMessage(ticket_id=ticket_id, role="bot", text=reply_text)
+async def _save_bot_reply(db: AsyncSession, ticket: Ticket, reply_text: str) -> ChatMessage:
+    bot_msg = ChatMessage(ticket_id=ticket.id, role="bot", text=reply_text)
     db.add(bot_msg)
-    await db.commit()
-    await db.refresh(bot_msg)
-
     # Email client the AI reply
     if ticket.email:
-        try:
-            await send_chat_message_to_client(ticket.email, reply_text, ticket_id)
-        except Exception as exc:
-            logger.warning(f"Failed to email client AI reply for ticket {ticket_id}: {exc}")
-
+        await db.flush()
+        queue_chat_message_email(db, bot_msg, ticket.email)
+    await db.commit()
+    await db.refresh(bot_msg)
     return bot_msg
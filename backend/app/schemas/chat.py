@@ -8,6 +8,7 @@ class ChatMessageOut(BaseModel):
     role: str
     text: str
     created_at: datetime
+    delivery_status: str | None = None
 
     model_config = {"from_attributes": True}
 
@@ -9,6 +9,8 @@ class KbFileOut(BaseModel):
     file_path: str
     file_size: int | None
     mime_type: str | None
+    indexed_at: datetime | None = None
+    index_error: str | None = None
     created_at: datetime
 
     model_config = {"from_attributes": True}
@@ -18,12 +18,71 @@ class TicketOut(BaseModel):
     ai_response: str | None
     status: str
     assigned_to: int | None
+    duplicate_of: int | None = None
     created_at: datetime
     updated_at: datetime
 
     model_config = {"from_attributes": True}
 
 
+class TicketListItem(BaseModel):
+    """Облегчённая проекция для списка — без original_email и ai_response."""
+    id: int
+    date_received: datetime
+    full_name: str | None
+    company: str | None
+    phone: str | None
+    email: str | None
+    device_serials: list[str] | None = []
+    device_type: str | None
+    sentiment: str | None
+    category: str | None
+    summary: str | None
+    status: str
+    assigned_to: int | None
+    duplicate_of: int | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class TicketPage(BaseModel):
+    items: list[TicketListItem]
+    next_cursor: str | None = None
+    sync_since: datetime | None = None   # передать в updated_since, чтобы получить только изменения
+
+
+class TicketSearchHit(TicketListItem):
+    rank: float
+    matched_in: str          # ticket | chat
+    snippet: str             # HTML-экранирован, совпадения в <mark>…</mark>
+
+
+class TicketSearchPage(BaseModel):
+    items: list[TicketSearchHit]
+    next_offset: int | None = None
+
+
+class TicketStats(BaseModel):
+    """Сводка для вкладки «Статистика» — по всем заявкам, а не по загруженной странице."""
+    total: int
+    by_status: dict[str, int]
+    by_category: dict[str, int]      # без категории — в other
+    by_sentiment: dict[str, int]     # без тональности — в other
+
+
+class AttachmentOut(BaseModel):
+    id: int
+    ticket_id: int
+    filename: str | None
+    mime_type: str | None
+    size: int | None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
 class TicketUpdate(BaseModel):
     status: str | None = None
     ai_response: str | None = None
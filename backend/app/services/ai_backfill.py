@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from collections.abc import Callable
+
+from sqlalchemy import ARRAY, String, bindparam, case, func, select, update
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.ticket import Ticket
+from app.services.ai_service import analyze_tickets_batch
+
+logger = logging.getLogger(__name__)
+
+_tickets = Ticket.__table__
+
+# Те же правила, что в ai_jobs._apply_ai_result: оценки модели перезаписываются,
+# поля карточки заполняются только если пусты. Один executemany на пачку заявок.
+_UPDATE_TICKET = (
+    update(_tickets)
+    .where(_tickets.c.id == bindparam("b_id"))
+    .values(
+        sentiment=bindparam("b_sentiment"),
+        category=bindparam("b_category"),
+        ai_response=bindparam("b_ai_response"),
+        full_name=func.coalesce(_tickets.c.full_name, bindparam("b_full_name")),
+        company=func.coalesce(_tickets.c.company, bindparam("b_company")),
+        phone=func.coalesce(_tickets.c.phone, bindparam("b_phone")),
+        device_type=func.coalesce(_tickets.c.device_type, bindparam("b_device_type")),
+        summary=func.coalesce(_tickets.c.summary, bindparam("b_summary")),
+        device_serials=case(
+            (func.cardinality(_tickets.c.device_serials) > 0, _tickets.c.device_serials),
+            else_=bindparam("b_device_serials", type_=ARRAY(String)),
+        ),
+    )
+)
+
+
+def _update_params(ticket_id: int, ai_result: dict) -> dict:
+    return {
+        "b_id": ticket_id,
+        "b_sentiment": ai_result.get("sentiment"),
+        "b_category": ai_result.get("category"),
+        "b_ai_response": ai_result.get("draft_response"),
+        "b_full_name": ai_result.get("full_name"),
+        "b_company": ai_result.get("company"),
+        "b_phone": ai_result.get("phone"),
+        "b_device_type": ai_result.get("device_type"),
+        "b_summary": ai_result.get("summary"),
+        "b_device_serials": ai_result.get("device_serials") or [],
+    }
+
+
+def _pack(rows: list[tuple[int, str]], batch_size: int) -> list[list[tuple[int, str]]]:
+    """Short tickets go several per request, long ones alone."""
+    packs, current = [], []
+    for row in rows:
+        if len(row[1]) > settings.AI_BATCH_MAX_CHARS:
+            packs.append([row])
+            continue
+        current.append(row)
+        if len(current) >= batch_size:
+            packs.append(current)
+            current = []
+    if current:
+        packs.append(current)
+    return packs
+
+
+async def reanalyze_range(
+    from_id: int = 0,
+    to_id: int | None = None,
+    only_missing: bool = False,
+    batch_size: int | None = None,
+    lanes: int | None = None,
+    chunk: int | None = None,
+    on_progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """Re-run AI analysis for tickets with from_id < id <= to_id, in id order.
+
+    Tickets are read in chunks, analyzed in micro-batches over parallel lanes and
+    written back with one bulk UPDATE per chunk. If a batch fails, the successful
+    results of the chunk are still written and the run stops; `last_id` in the
+    returned stats is then safe to pass as `from_id` to resume (already analyzed
+    tickets on the way are answered from the analysis cache).
+    """
+    batch_size = batch_size or settings.AI_BATCH_SIZE
+    chunk = chunk or settings.AI_BACKFILL_CHUNK
+    semaphore = asyncio.Semaphore(lanes or settings.AI_BACKFILL_LANES)
+    stats = {"processed": 0, "failed": 0, "last_id": from_id, "error": None}
+
+    async def run_pack(pack: list[tuple[int, str]]) -> list[dict]:
+        async with semaphore:
+            return await analyze_tickets_batch([text for _, text in pack])
+
+    while True:
+        query = (
+            select(Ticket.id, func.coalesce(Ticket.original_email, Ticket.summary, ""))
+            .where(Ticket.id > stats["last_id"])
+            .order_by(Ticket.id)
+            .limit(chunk)
+        )
+        if to_id is not None:
+            query = query.where(Ticket.id <= to_id)
+        if only_missing:
+            query = query.where(Ticket.sentiment.is_(None))
+        async with AsyncSessionLocal() as session:
+            fetched = (await session.execute(query)).all()
+        if not fetched:
+            return stats
+        # Пустые тексты анализировать нечем — просто проходим мимо
+        rows = [(ticket_id, text) for ticket_id, text in fetched if text.strip()]
+
+        packs = _pack(rows, batch_size)
+        outcomes = await asyncio.gather(*(run_pack(p) for p in packs), return_exceptions=True)
+
+        params, failed_ids = [], []
+        for pack, outcome in zip(packs, outcomes):
+            if isinstance(outcome, BaseException):
+                failed_ids.extend(ticket_id for ticket_id, _ in pack)
+                stats["error"] = str(outcome)
+                continue
+            params.extend(_update_params(ticket_id, r) for (ticket_id, _), r in zip(pack, outcome))
+
+        if params:
+            async with AsyncSessionLocal() as session:
+                await session.execute(_UPDATE_TICKET, params)
+                await session.commit()
+        stats["processed"] += len(params)
+
+        if failed_ids:
+            stats["failed"] = len(failed_ids)
+            stats["last_id"] = min(failed_ids) - 1
+            logger.error(f"Reanalysis stopped at ticket #{min(failed_ids)}: {stats['error']}")
+            if on_progress:
+                on_progress(stats)
+            return stats
+
+        stats["last_id"] = fetched[-1][0]
+        if on_progress:
+            on_progress(stats)
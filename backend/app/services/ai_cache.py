@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, update, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.ai_cache import AiCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Части текста, которые отличают повторы одного и того же письма, но не меняют смысл
+_DATETIME_RE = re.compile(r"\b\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b|\b\d{1,2}:\d{2}(:\d{2})?\b")
+_REPLY_PREFIX_RE = re.compile(r"^((re|fwd?|ответ|пересл)\s*:\s*)+", re.IGNORECASE | re.MULTILINE)
+_QUOTE_RE = re.compile(r"^\s*>+\s?", re.MULTILINE)
+_WS_RE = re.compile(r"\s+")
+
+_PURGE_EVERY = 100
+
+# key → (срок годности по time.monotonic(), результат); срок — тот же AI_CACHE_TTL, что у строки в БД
+_memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+
+def normalize_text(text: str) -> str:
+    text = _QUOTE_RE.sub("", text)
+    text = _REPLY_PREFIX_RE.sub("", text)
+    text = _DATETIME_RE.sub("", text)
+    return _WS_RE.sub(" ", text).strip().lower()
+
+
+def cache_key(text: str, model: str, prompt_version: str, temperature: float) -> str:
+    raw = f"{model}\x00{prompt_version}\x00{temperature}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _remember(key: str, result: dict, ttl: float) -> None:
+    _memory[key] = (time.monotonic() + ttl, result)
+    _memory.move_to_end(key)
+    while len(_memory) > settings.AI_CACHE_MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+
+async def get(key: str) -> dict | None:
+    entry = _memory.get(key)
+    if entry is not None:
+        expires, result = entry
+        if time.monotonic() < expires:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return dict(result)
+        del _memory[key]
+
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(AiCacheEntry)
+                .where(AiCacheEntry.key == key, AiCacheEntry.expires_at > func.now())
+                .values(hits=AiCacheEntry.hits + 1)
+                .returning(AiCacheEntry.result, AiCacheEntry.expires_at)
+            )
+            row = result.first()
+            await session.commit()
+    except Exception as e:
+        logger.warning(f"AI cache lookup failed: {e}")
+        row = None
+
+    if row is None:
+        _stats["misses"] += 1
+        return None
+    cached, expires_at = row
+    _stats["db_hits"] += 1
+    # В памяти запись живёт не дольше, чем её строка в БД
+    _remember(key, cached, (expires_at - datetime.now(timezone.utc)).total_seconds())
+    return dict(cached)
+
+
+async def put(key: str, result: dict) -> None:
+    _remember(key, result, settings.AI_CACHE_TTL)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.AI_CACHE_TTL)
+    try:
+        async with AsyncSessionLocal() as session:
+            stmt = insert(AiCacheEntry).values(key=key, result=result, expires_at=expires_at)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[AiCacheEntry.key],
+                set_={"result": stmt.excluded.result, "expires_at": stmt.excluded.expires_at},
+            ))
+            _stats["writes"] += 1
+            if _stats["writes"] % _PURGE_EVERY == 0:
+                await session.execute(delete(AiCacheEntry).where(AiCacheEntry.expires_at <= func.now()))
+            await session.commit()
+    except Exception as e:
+        logger.warning(f"AI cache write failed: {e}")
+
+
+def stats() -> dict:
+    lookups = _stats["memory_hits"] + _stats["db_hits"] + _stats["misses"]
+    hits = _stats["memory_hits"] + _stats["db_hits"]
+    return {**_stats, "memory_size": len(_memory), "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
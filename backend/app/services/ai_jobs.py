@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, or_, and_, func
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.ai_job import AiJob
+from app.models.chat_message import ChatMessage
+from app.models.ticket import Ticket
+from app.services.ai_service import analyze_ticket_with_ai
+from app.services.llm_client import CircuitOpenError
+from app.services.outbox import queue_chat_message_email
+
+logger = logging.getLogger(__name__)
+
+OPERATOR_HINT = "\n\n💡 Если нужно вызвать оператора, напишите — вызвать оператора"
+
+
+async def _claim_job() -> tuple[int, int, bool, int] | None:
+    """Take one due job with FOR UPDATE SKIP LOCKED, so workers never grab the same row."""
+    stale_before = func.now() - timedelta(seconds=settings.AI_JOB_LOCK_TIMEOUT)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(AiJob)
+            .where(or_(
+                and_(AiJob.status == "pending", AiJob.run_after <= func.now()),
+                # Воркер упал посреди задачи — забираем её обратно
+                and_(AiJob.status == "running", AiJob.locked_at < stale_before),
+            ))
+            .order_by(AiJob.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            return None
+        job.status = "running"
+        job.locked_at = func.now()
+        job.attempts += 1
+        claimed = (job.id, job.ticket_id, job.reply_to_client, job.attempts)
+        await session.commit()
+    return claimed
+
+
+def _apply_ai_result(ticket: Ticket, ai_result: dict) -> None:
+    ticket.sentiment = ai_result.get("sentiment")
+    ticket.category = ai_result.get("category")
+    ticket.ai_response = ai_result.get("draft_response")
+    ticket.full_name = ticket.full_name or ai_result.get("full_name")
+    ticket.company = ticket.company or ai_result.get("company")
+    ticket.phone = ticket.phone or ai_result.get("phone")
+    ticket.device_serials = ticket.device_serials or ai_result.get("device_serials") or []
+    ticket.device_type = ticket.device_type or ai_result.get("device_type")
+    ticket.summary = ticket.summary or ai_result.get("summary")
+
+
+async def _propagate_to_duplicates(session, ticket_id: int, ai_result: dict) -> None:
+    """Near-duplicates of the ticket have no AI job of their own and take its analysis."""
+    await session.execute(
+        update(Ticket)
+        .where(Ticket.duplicate_of == ticket_id, Ticket.sentiment.is_(None))
+        .values(
+            sentiment=ai_result.get("sentiment"),
+            category=ai_result.get("category"),
+            ai_response=ai_result.get("draft_response"),
+            summary=func.coalesce(Ticket.summary, ai_result.get("summary")),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _own_job(session, job_id: int, attempts: int) -> AiJob | None:
+    """Lock the job row if it is still this worker's claim.
+
+    None if the ticket (and with it the job) was deleted, or if the job was
+    reclaimed by another worker after AI_JOB_LOCK_TIMEOUT: then the result of
+    this attempt is dropped, so the client never gets a second bot reply.
+    """
+    job = await session.get(AiJob, job_id, with_for_update=True)
+    if job is None or job.status != "running" or job.attempts != attempts:
+        return None
+    return job
+
+
+async def _run_job(job_id: int, ticket_id: int, reply_to_client: bool, attempts: int) -> None:
+    async with AsyncSessionLocal() as session:
+        ticket = await session.get(Ticket, ticket_id)
+        ticket_text = (ticket.original_email or ticket.summary or "") if ticket else ""
+
+    ai_result = await analyze_ticket_with_ai(ticket_text, strict=True) if ticket_text else None
+
+    async with AsyncSessionLocal() as session:
+        job = await _own_job(session, job_id, attempts)
+        if job is None:
+            logger.warning(f"AI job #{job_id} (ticket #{ticket_id}) is no longer ours, result dropped")
+            return
+        ticket = await session.get(Ticket, ticket_id)
+        if ticket and ai_result:
+            _apply_ai_result(ticket, ai_result)
+            await _propagate_to_duplicates(session, ticket_id, ai_result)
+            if reply_to_client:
+                bot_text = (ai_result.get("draft_response") or "") + OPERATOR_HINT
+                bot_msg = ChatMessage(ticket_id=ticket_id, role="bot", text=bot_text)
+                session.add(bot_msg)
+                if ticket.email:
+                    await session.flush()
+                    queue_chat_message_email(session, bot_msg, ticket.email)
+        job.status = "done"
+        job.locked_at = None
+        job.last_error = None
+        await session.commit()
+
+
+async def _heartbeat(job_id: int, attempts: int) -> None:
+    """Keep `locked_at` fresh while the job runs, so it is not taken for a dead worker's.
+
+    LLM retries and rate-limit waits can last longer than AI_JOB_LOCK_TIMEOUT.
+    """
+    while True:
+        await asyncio.sleep(settings.AI_JOB_LOCK_TIMEOUT / 3)
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(AiJob)
+                    .where(AiJob.id == job_id, AiJob.status == "running", AiJob.attempts == attempts)
+                    .values(locked_at=func.now())
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"AI job #{job_id}: heartbeat failed: {e}")
+
+
+async def _fail_job(job_id: int, ticket_id: int, attempts: int, error: Exception) -> None:
+    async with AsyncSessionLocal() as session:
+        job = await _own_job(session, job_id, attempts)
+        if job is None:
+            return
+        job.last_error = str(error)[:2000]
+        job.locked_at = None
+        if isinstance(error, CircuitOpenError):
+            # Провайдер лежит — попытку не засчитываем, ждём, пока цепь замкнётся
+            job.attempts -= 1
+            job.status = "pending"
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=settings.LLM_BREAKER_RESET_SECONDS)
+            logger.warning(f"AI job #{job_id} (ticket #{ticket_id}) postponed: {error}")
+        elif attempts >= settings.AI_JOB_MAX_ATTEMPTS:
+            job.status = "dead"
+            # Заявка не должна остаться без тональности и категории
+            ticket = await session.get(Ticket, ticket_id)
+            if ticket:
+                ticket.sentiment = ticket.sentiment or "neutral"
+                ticket.category = ticket.category or "other"
+                await _propagate_to_duplicates(session, ticket_id, {"sentiment": "neutral", "category": "other"})
+            logger.error(f"AI job #{job_id} (ticket #{ticket_id}) is dead after {attempts} attempts: {error}")
+        else:
+            delay = settings.AI_JOB_BACKOFF_SECONDS * 2 ** (attempts - 1)
+            job.status = "pending"
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            logger.warning(f"AI job #{job_id} (ticket #{ticket_id}) failed, retry in {delay:.0f}s: {error}")
+        await session.commit()
+
+
+async def _worker(worker_no: int) -> None:
+    while True:
+        try:
+            claimed = await _claim_job()
+        except Exception as e:
+            logger.error(f"AI worker {worker_no}: failed to claim job: {e}")
+            await asyncio.sleep(settings.AI_JOB_POLL_INTERVAL)
+            continue
+
+        if claimed is None:
+            await asyncio.sleep(settings.AI_JOB_POLL_INTERVAL)
+            continue
+
+        job_id, ticket_id, reply_to_client, attempts = claimed
+        heartbeat = asyncio.create_task(_heartbeat(job_id, attempts))
+        try:
+            await _run_job(job_id, ticket_id, reply_to_client, attempts)
+        except Exception as e:
+            try:
+                await _fail_job(job_id, ticket_id, attempts, e)
+            except Exception as fail_exc:
+                # Задачу подберёт другой воркер по AI_JOB_LOCK_TIMEOUT
+                logger.error(f"AI worker {worker_no}: failed to record job #{job_id} failure: {fail_exc}")
+        finally:
+            heartbeat.cancel()
+
+
+async def start_ai_workers(concurrency: int | None = None) -> None:
+    """Run `concurrency` queue workers until cancelled."""
+    concurrency = concurrency or settings.AI_WORKERS
+    logger.info(f"AI workers started (concurrency={concurrency})")
+    await asyncio.gather(*(_worker(n) for n in range(concurrency)))
@@ -1,131 +1,241 @@
+import hashlib
 import json
 import logging
-from groq import AsyncGroq
+from collections.abc import AsyncIterator
 from app.config import settings
+from app.services import ai_cache, kb_index
+from app.services.extractor import extract_fields
+from app.services.llm_client import LlmClient
+from app.services.llm_providers import create_provider
 
 logger = logging.getLogger(__name__)
 
-# Initialize the Groq client
-# Ensure that GROQ_API_KEY is present in the environment or config
-try:
-    groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-except Exception as e:
-    logger.error(f"Failed to initialize Groq client: {e}")
-    groq_client = None
+# Провайдер выбирается настройкой LLM_PROVIDER (groq или офлайн-заглушка fake)
+llm = LlmClient(create_provider())
 
-async def analyze_ticket_with_ai(ticket_text: str) -> dict:
-    """
-    Analyzes a support ticket using Llama 3.3 via Groq API.
-    Returns a dictionary with:
-      - sentiment (positive, neutral, negative)
-      - category (string)
-      - draft_response (string)
-      - confidence (float)
-    """
-    if not groq_client:
-        logger.error("Groq client not initialized, returning fallback data")
-        return {
-            "sentiment": "neutral",
-            "category": "other",
-            "full_name": None,
-            "company": None,
-            "phone": None,
-            "device_serials": [],
-            "device_type": None,
-            "summary": None,
-            "draft_response": "Извините, в данный момент ИИ-помощник недоступен.",
-            "confidence": 0.0,
-        }
-
-    system_prompt = """
-Вы — ИИ-агент технической поддержки компании ЭРИС (производитель газоаналитического оборудования).
-Ваша задача — проанализировать входящее обращение клиента и извлечь из него структурированную информацию.
+ANALYSIS_MODEL = settings.LLM_ANALYSIS_MODEL
+ANALYSIS_TEMPERATURE = 0.3
+# Увеличивать при любом изменении _ANALYSIS_PROMPT — иначе кэш отдаст ответы старого промпта
+ANALYSIS_PROMPT_VERSION = "2"
 
-Правила определения типа прибора по заводскому номеру (9 цифр):
-- Первые три цифры — код модели. Примеры: 230 → «ДГС ЭРИС-230», 124 → «ДГС ЭРИС-124».
-- Если тип прибора явно указан в тексте — используйте его. Если нет — определяйте по первым трём цифрам серийного номера.
+# Серийные номера, тип прибора и телефон извлекает app.services.extractor до вызова модели
+_ANALYSIS_PROMPT = """
+Вы — ИИ-агент технической поддержки компании ЭРИС (производитель газоаналитического оборудования).
+Проанализируйте входящее обращение клиента.
 
 Ответьте ТОЛЬКО в формате JSON со следующими ключами (все строки на русском, null если информация отсутствует):
 - "sentiment": "positive" | "neutral" | "negative" — эмоциональная тональность обращения
 - "category": "malfunction" | "calibration" | "documentation" | "other" — категория запроса
 - "full_name": строка или null — ФИО отправителя
 - "company": строка или null — название организации / объекта / предприятия
-- "phone": строка или null — номер телефона
-- "device_serials": массив строк — все найденные заводские номера приборов (9-значные числа), пустой массив если не найдены
-- "device_type": строка или null — тип(ы) прибора (определить по серийному номеру или из текста)
 - "summary": строка — краткое изложение сути обращения (1-3 предложения)
 - "draft_response": строка — подробный, вежливый ответ клиенту на русском языке
 - "confidence": число от 0.0 до 1.0 — уверенность в ответе
 """
 
+
+def _fallback_analysis(extracted: dict, draft_response: str) -> dict:
+    return {
+        "sentiment": "neutral",
+        "category": "other",
+        "full_name": None,
+        "company": None,
+        "phone": extracted["phone"],
+        "device_serials": extracted["device_serials"],
+        "device_type": extracted["device_type"],
+        "summary": None,
+        "draft_response": draft_response,
+        "confidence": 0.0,
+    }
+
+
+def _analysis_cache_key(ticket_text: str, kb_version: str = "") -> str:
+    # Имя провайдера в ключе — ответы fake-провайдера не должны попасть к настоящему;
+    # отпечаток индекса базы знаний — после правки KB ответ пересчитывается
+    prompt_version = ANALYSIS_PROMPT_VERSION
+    if kb_version:
+        prompt_version += "+kb:" + hashlib.sha1(kb_version.encode()).hexdigest()[:12]
+    return ai_cache.cache_key(
+        ticket_text, f"{llm.provider.name}/{ANALYSIS_MODEL}" if llm.available else ANALYSIS_MODEL,
+        prompt_version, ANALYSIS_TEMPERATURE,
+    )
+
+
+def _with_knowledge(system_prompt: str, knowledge: str | None) -> str:
+    if not knowledge:
+        return system_prompt
+    return (
+        f"{system_prompt}\n\nФрагменты базы знаний ЭРИС (используйте, только если они относятся к вопросу):\n"
+        f"{knowledge}"
+    )
+
+
+def _analysis_input(ticket_text: str, extracted: dict) -> str:
+    if extracted["device_type"]:
+        # Короткая подсказка для черновика ответа вместо правил разбора номеров в промпте
+        return ticket_text + f"\n\n[Приборы: {extracted['device_type']}]"
+    return ticket_text
+
+
+def _normalize_analysis(result: dict, extracted: dict) -> dict:
+    sentiment = (result.get("sentiment") or "neutral").lower()
+    if sentiment not in ["positive", "neutral", "negative"]:
+        sentiment = "neutral"
+
+    category = (result.get("category") or "other").lower()
+    if category not in ["malfunction", "calibration", "documentation", "other"]:
+        category = "other"
+
+    return {
+        "sentiment": sentiment,
+        "category": category,
+        "full_name": result.get("full_name") or None,
+        "company": result.get("company") or None,
+        "phone": extracted["phone"],
+        "device_serials": extracted["device_serials"],
+        "device_type": extracted["device_type"],
+        "summary": result.get("summary") or None,
+        "draft_response": result.get("draft_response", ""),
+        "confidence": float(result.get("confidence", 1.0)),
+    }
+
+
+async def analyze_ticket_with_ai(ticket_text: str, strict: bool = False) -> dict:
+    """
+    Analyzes a support ticket with the configured LLM provider (Llama 3.3 via Groq by default).
+    Returns a dictionary with:
+      - sentiment (positive, neutral, negative)
+      - category (string)
+      - draft_response (string)
+      - confidence (float)
+
+    With strict=True errors are raised instead of returning fallback data,
+    so the job queue can retry the analysis later.
+    Successful results are cached by normalized text, model, prompt version, temperature
+    and the KB index version; the cache is checked before the KB search.
+    Serials, device type and phone come from the local regex extractor, also when the LLM is unavailable.
+    The closest knowledge-base fragments (see kb_index.retrieve) are added to the prompt.
+    """
+    extracted = extract_fields(ticket_text)
+
+    key = None
+    if settings.AI_CACHE_ENABLED:
+        # Кэш — до поиска по базе знаний: попадание не платит за эмбеддинг и запрос к pgvector
+        key = _analysis_cache_key(ticket_text, await kb_index.index_version())
+        cached = await ai_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if not llm.available:
+        if strict:
+            raise RuntimeError("LLM provider not initialized")
+        logger.error("LLM provider not initialized, returning fallback data")
+        return _fallback_analysis(extracted, "Извините, в данный момент ИИ-помощник недоступен.")
+
+    knowledge = await kb_index.retrieve(ticket_text)
     try:
-        response = await groq_client.chat.completions.create(
+        response = await llm.chat(
             messages=[
                 {
                     "role": "system",
-                    "content": system_prompt
+                    "content": _with_knowledge(_ANALYSIS_PROMPT, knowledge)
                 },
                 {
                     "role": "user",
-                    "content": ticket_text
+                    "content": _analysis_input(ticket_text, extracted)
                 }
             ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.3,
+            model=ANALYSIS_MODEL,
+            temperature=ANALYSIS_TEMPERATURE,
             max_tokens=1024,
-            response_format={"type": "json_object"}
+            json_mode=True,
         )
 
-        content = response.choices[0].message.content
-        result = json.loads(content)
-        
-        # Validation/Normalization
-        sentiment = result.get("sentiment", "neutral").lower()
-        if sentiment not in ["positive", "neutral", "negative"]:
-            sentiment = "neutral"
-
-        category = result.get("category", "other").lower()
-        if category not in ["malfunction", "calibration", "documentation", "other"]:
-            category = "other"
-
-        device_serials = result.get("device_serials", [])
-        if not isinstance(device_serials, list):
-            device_serials = []
-
-        return {
-            "sentiment": sentiment,
-            "category": category,
-            "full_name": result.get("full_name") or None,
-            "company": result.get("company") or None,
-            "phone": result.get("phone") or None,
-            "device_serials": [str(s) for s in device_serials],
-            "device_type": result.get("device_type") or None,
-            "summary": result.get("summary") or None,
-            "draft_response": result.get("draft_response", ""),
-            "confidence": float(result.get("confidence", 1.0)),
-        }
-        
+        analysis = _normalize_analysis(json.loads(response.text), extracted)
+        if key:
+            await ai_cache.put(key, analysis)
+        return analysis
+
     except Exception as e:
+        if strict:
+            raise
         logger.error(f"Error during AI analysis: {e}")
-        return {
-            "sentiment": "neutral",
-            "category": "other",
-            "full_name": None,
-            "company": None,
-            "phone": None,
-            "device_serials": [],
-            "device_type": None,
-            "summary": None,
-            "draft_response": "Извините, произошла ошибка при генерации ответа.",
-            "confidence": 0.0,
-        }
-
-
-async def generate_chat_reply(ticket_context: str, chat_history: list[dict]) -> str:
-    """Generate a contextual AI reply for the chat window."""
-    if not groq_client:
-        return "ИИ-помощник временно недоступен."
+        return _fallback_analysis(extracted, "Извините, произошла ошибка при генерации ответа.")
+
 
+_BATCH_PROMPT = _ANALYSIS_PROMPT + """
+Во входных данных — JSON-массив обращений вида {"id": число, "text": строка}.
+Проанализируйте каждое обращение независимо и ответьте JSON-объектом {"results": [...]},
+где каждый элемент содержит "id" обращения и все ключи, перечисленные выше.
+"""
+# Токенов ответа на одно обращение в пачке: в основном это draft_response
+_BATCH_TOKENS_PER_TICKET = 700
+
+
+async def analyze_tickets_batch(ticket_texts: list[str]) -> list[dict]:
+    """Analyze several short tickets with one LLM request.
+
+    Results come back in input order and are cached like single analyses.
+    Tickets the model skipped in the batch answer are analyzed one by one.
+    Batched prompts carry no knowledge-base fragments: they would not fit the token budget.
+    Provider errors are raised (as with strict=True), so a backfill can stop and resume.
+    """
+    if not llm.available:
+        raise RuntimeError("LLM provider not initialized")
+
+    extracted = [extract_fields(text) for text in ticket_texts]
+    results: list[dict | None] = [None] * len(ticket_texts)
+    keys: list[str | None] = [None] * len(ticket_texts)
+    if settings.AI_CACHE_ENABLED:
+        for i, text in enumerate(ticket_texts):
+            keys[i] = _analysis_cache_key(text)
+            results[i] = await ai_cache.get(keys[i])
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    if len(pending) > 1:
+        payload = [{"id": i, "text": _analysis_input(ticket_texts[i], extracted[i])} for i in pending]
+        response = await llm.chat(
+            messages=[
+                {"role": "system", "content": _BATCH_PROMPT},
+                {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+            ],
+            model=ANALYSIS_MODEL,
+            temperature=ANALYSIS_TEMPERATURE,
+            max_tokens=_BATCH_TOKENS_PER_TICKET * len(pending),
+            json_mode=True,
+        )
+        try:
+            items = json.loads(response.text).get("results") or []
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Malformed batch analysis answer, falling back to single requests: {e}")
+            items = []
+        for item in items:
+            i = item.get("id") if isinstance(item, dict) else None
+            if isinstance(i, int) and i in pending and results[i] is None:
+                results[i] = _normalize_analysis(item, extracted[i])
+                if keys[i]:
+                    await ai_cache.put(keys[i], results[i])
+
+    for i in pending:
+        if results[i] is None:
+            results[i] = await analyze_ticket_with_ai(ticket_texts[i], strict=True)
+    return results
+
+
+CHAT_MODEL = settings.LLM_CHAT_MODEL
+CHAT_TEMPERATURE = 0.5
+CHAT_ERROR_REPLY = "Извините, не удалось сгенерировать ответ."
+CHAT_UNAVAILABLE_REPLY = "ИИ-помощник временно недоступен."
+
+
+async def _chat_knowledge(ticket_context: str, chat_history: list[dict]) -> str | None:
+    # Ищем по последней реплике — именно на неё отвечает модель
+    return await kb_index.retrieve(chat_history[-1]["text"] if chat_history else ticket_context)
+
+
+def _chat_messages(
+    ticket_context: str, chat_history: list[dict], summary: str | None, knowledge: str | None = None
+) -> list[dict]:
     system_prompt = (
         "Вы — ИИ-агент технической поддержки компании ЭРИС (газоаналитическое оборудование). "
         "Вы ведёте диалог с оператором службы поддержки, помогая разобраться в обращении клиента. "
@@ -133,20 +243,86 @@ async def generate_chat_reply(ticket_context: str, chat_history: list[dict]) ->
         "Если не знаете точного ответа — скажите об этом и предложите варианты.\n\n"
         f"Контекст заявки:\n{ticket_context}"
     )
+    if summary:
+        system_prompt += f"\n\nКраткое содержание предыдущей переписки:\n{summary}"
 
-    messages = [{"role": "system", "content": system_prompt}]
+    messages = [{"role": "system", "content": _with_knowledge(system_prompt, knowledge)}]
     for m in chat_history:
         role = "assistant" if m["role"] == "bot" else "user"
         messages.append({"role": role, "content": m["text"]})
+    return messages
+
 
+async def generate_chat_reply(ticket_context: str, chat_history: list[dict], summary: str | None = None) -> str:
+    """Generate a contextual AI reply for the chat window.
+
+    `summary` is the rolling summary of turns that are no longer in `chat_history`;
+    knowledge-base fragments relevant to the last turn go into the system prompt.
+    """
+    if not llm.available:
+        return CHAT_UNAVAILABLE_REPLY
+
+    knowledge = await _chat_knowledge(ticket_context, chat_history)
     try:
-        response = await groq_client.chat.completions.create(
-            messages=messages,
-            model="llama-3.3-70b-versatile",
-            temperature=0.5,
+        response = await llm.chat(
+            messages=_chat_messages(ticket_context, chat_history, summary, knowledge),
+            model=CHAT_MODEL,
+            temperature=CHAT_TEMPERATURE,
             max_tokens=512,
         )
-        return response.choices[0].message.content.strip()
+        return response.text.strip()
     except Exception as e:
         logger.error(f"Chat reply generation error: {e}")
-        return "Извините, не удалось сгенерировать ответ."
+        return CHAT_ERROR_REPLY
+
+
+async def stream_chat_reply(
+    ticket_context: str, chat_history: list[dict], summary: str | None = None
+) -> AsyncIterator[str]:
+    """Same as generate_chat_reply, but yields text chunks as the model produces them.
+
+    Unlike generate_chat_reply, a provider error is raised rather than replaced with
+    CHAT_ERROR_REPLY: part of the reply may already be sent, and the caller must discard it.
+    """
+    if not llm.available:
+        yield CHAT_UNAVAILABLE_REPLY
+        return
+
+    knowledge = await _chat_knowledge(ticket_context, chat_history)
+    try:
+        async for delta in llm.stream(
+            messages=_chat_messages(ticket_context, chat_history, summary, knowledge),
+            model=CHAT_MODEL,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=512,
+        ):
+            yield delta
+    except Exception as e:
+        logger.error(f"Chat reply streaming error: {e}")
+        raise
+
+
+async def summarize_chat(previous_summary: str | None, turns: list[dict]) -> str | None:
+    """Fold `turns` into the running summary. Returns None if the model is unavailable."""
+    if not llm.available:
+        return None
+
+    dialogue = "\n".join(f"{m['role']}: {m['text']}" for m in turns)
+    prompt = (
+        "Обнови краткое содержание переписки службы поддержки с клиентом, добавив новые реплики. "
+        "Сохрани факты: суть проблемы, номера и типы приборов, что уже предложено и что ответил клиент. "
+        f"Не более {settings.CHAT_SUMMARY_TOKENS * 3} символов, на русском.\n\n"
+        f"Текущее содержание:\n{previous_summary or '(пусто)'}\n\n"
+        f"Новые реплики:\n{dialogue}"
+    )
+    try:
+        response = await llm.chat(
+            messages=[{"role": "user", "content": prompt}],
+            model=CHAT_MODEL,
+            temperature=0.2,
+            max_tokens=settings.CHAT_SUMMARY_TOKENS,
+        )
+        return response.text.strip() or None
+    except Exception as e:
+        logger.error(f"Chat summary error: {e}")
+        return None
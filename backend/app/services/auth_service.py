@@ -1,3 +1,8 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
 from jose import jwt, JWTError
@@ -8,17 +13,36 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds = текущей стоимости: хэши со старой (меньшей) стоимостью needs_update и перехэшируются при входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.AUTH_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.AUTH_BCRYPT_ROUNDS,
+)
+
+# bcrypt — 100–300 мс CPU на вызов. Отдельный ограниченный пул: вход не блокирует event loop
+# и не занимает общий executor (to_thread), а шторм логинов съедает не больше AUTH_HASH_WORKERS ядер
+_hash_executor = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 
 def hash_password(password: str) -> str:
+    """Blocking; an API path that sets passwords must run it in _hash_executor."""
     return pwd_context.hash(password)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
+    """Blocking; in request handlers use verify_and_update_password."""
     return pwd_context.verify(plain, hashed)
 
 
+async def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """(valid, new_hash): new_hash is set when the stored hash uses outdated parameters."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, plain, hashed
+    )
+
+
 def create_access_token(user_id: int) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return jwt.encode(
@@ -43,6 +67,68 @@ async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
 
 async def authenticate(db: AsyncSession, email: str, password: str) -> User | None:
     user = await get_user_by_email(db, email)
-    if not user or not verify_password(password, user.password_hash):
+    if not user:
+        return None
+    valid, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        # Пароль известен только сейчас — единственный момент, когда можно поднять стоимость хэша
+        user.password_hash = new_hash
+        await db.commit()
     return user
+
+
+# ── Кэш аутентифицированных пользователей ─────────────
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user as seen by request handlers; cached, not bound to a DB session."""
+    id: int
+    email: str
+    full_name: str
+    role: str
+    telegram_ids: tuple[int, ...]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            telegram_ids=tuple(t.telegram_id for t in user.telegram_ids),
+        )
+
+
+# (user_id, token) -> (monotonic deadline, principal). Подпись и exp токена проверяются
+# на каждом запросе до кэша — кэш экономит только чтение пользователя из БД
+_principals: OrderedDict[tuple[int, str], tuple[float, Principal]] = OrderedDict()
+
+
+def get_cached_principal(user_id: int, token: str) -> Principal | None:
+    entry = _principals.get((user_id, token))
+    if entry is None:
+        return None
+    deadline, principal = entry
+    if deadline < time.monotonic():
+        del _principals[(user_id, token)]
+        return None
+    return principal
+
+
+def cache_principal(token: str, principal: Principal) -> None:
+    key = (principal.id, token)
+    _principals[key] = (time.monotonic() + settings.AUTH_CACHE_TTL, principal)
+    _principals.move_to_end(key)
+    while len(_principals) > settings.AUTH_CACHE_SIZE:
+        _principals.popitem(last=False)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop every cached token of the user; called on profile/role change and on deletion.
+
+    Other processes learn about it from the `user` NOTIFY (see services.realtime);
+    AUTH_CACHE_TTL bounds the staleness if that channel is down.
+    """
+    for key in [k for k in _principals if k[0] == user_id]:
+        del _principals[key]
@@ -0,0 +1,126 @@
+import logging
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat_message import ChatMessage
+from app.models.ticket import Ticket
+from app.services.ai_service import summarize_chat
+from app.services.tokens import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def ticket_context(ticket: Ticket) -> str:
+    return truncate_to_tokens(ticket.original_email or ticket.summary or "", settings.CHAT_CONTEXT_TOKENS)
+
+
+def _fold_chunks(messages: list[ChatMessage]) -> list[list[dict]]:
+    """Split turns to fold into portions of at most CHAT_HISTORY_TOKENS each.
+
+    A long-untouched chat (or the first fold of an old one) would otherwise go to
+    the LLM as one oversized prompt.
+    """
+    chunks: list[list[dict]] = []
+    chunk: list[dict] = []
+    budget = settings.CHAT_HISTORY_TOKENS
+    for m in messages:
+        text = truncate_to_tokens(m.text, settings.CHAT_HISTORY_TOKENS)
+        cost = estimate_tokens(text)
+        if chunk and cost > budget:
+            chunks.append(chunk)
+            chunk, budget = [], settings.CHAT_HISTORY_TOKENS
+        chunk.append({"id": m.id, "role": m.role, "text": text})
+        budget -= cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+async def build_chat_history(db: AsyncSession, ticket: Ticket) -> tuple[str | None, list[dict], bool]:
+    """Recent turns within CHAT_HISTORY_TOKENS plus the rolling summary of everything older.
+
+    Only messages newer than `ticket.chat_summary_upto` are loaded and no LLM is
+    called: turns that fall out of the budget but are not folded yet are simply
+    left out of this prompt. The third value tells the caller to run
+    `fold_chat_history` after the reply is sent.
+    """
+    result = await db.execute(
+        select(ChatMessage)
+        .where(ChatMessage.ticket_id == ticket.id, ChatMessage.id > ticket.chat_summary_upto)
+        .order_by(ChatMessage.id)
+    )
+    messages = result.scalars().all()
+    recent = _recent_turns(messages)
+    return ticket.chat_summary, recent, len(recent) < len(messages)
+
+
+def _recent_turns(messages: list[ChatMessage]) -> list[dict]:
+    budget = settings.CHAT_HISTORY_TOKENS
+    recent: list[dict] = []
+    for m in reversed(messages):
+        cost = estimate_tokens(m.text)
+        if cost > budget:
+            if not recent:
+                # Последнюю реплику берём всегда, при необходимости обрезав
+                recent.append({"role": m.role, "text": truncate_to_tokens(m.text, budget)})
+            break
+        budget -= cost
+        recent.append({"role": m.role, "text": m.text})
+    recent.reverse()
+    return recent
+
+
+# Заявки, чья переписка сворачивается прямо сейчас в этом процессе
+_folding: set[int] = set()
+
+
+async def fold_chat_history(ticket_id: int) -> None:
+    """Fold turns that no longer fit CHAT_HISTORY_TOKENS into `tickets.chat_summary`.
+
+    Runs after the reply is sent, in its own session. Turns go to the LLM in
+    portions of CHAT_HISTORY_TOKENS together with the previous summary, and
+    `chat_summary_upto` is committed after each portion. The commit is
+    conditional on the position it started from, so two replies to the same
+    chat never fold the same turns twice.
+    """
+    if ticket_id in _folding:
+        return
+    _folding.add(ticket_id)
+    try:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(
+                select(Ticket.chat_summary, Ticket.chat_summary_upto).where(Ticket.id == ticket_id)
+            )).first()
+            if row is None:
+                return
+            summary, upto = row
+            messages = (await session.execute(
+                select(ChatMessage)
+                .where(ChatMessage.ticket_id == ticket_id, ChatMessage.id > upto)
+                .order_by(ChatMessage.id)
+            )).scalars().all()
+            older = messages[:len(messages) - len(_recent_turns(messages))]
+
+            for chunk in _fold_chunks(older):
+                new_summary = await summarize_chat(summary, chunk)
+                if not new_summary:
+                    # Модель недоступна — свернём при следующем ответе
+                    logger.warning(f"Chat summary for ticket #{ticket_id} not updated")
+                    return
+                new_upto = chunk[-1]["id"]
+                result = await session.execute(
+                    update(Ticket)
+                    .where(Ticket.id == ticket_id, Ticket.chat_summary_upto == upto)
+                    .values(chat_summary=new_summary, chat_summary_upto=new_upto)
+                )
+                await session.commit()
+                if result.rowcount == 0:
+                    return   # параллельно свернул другой процесс
+                summary, upto = new_summary, new_upto
+    except Exception as e:
+        logger.error(f"Chat summary for ticket #{ticket_id} failed: {e}")
+    finally:
+        _folding.discard(ticket_id)
@@ -1,26 +1,33 @@
 import asyncio
 import email
-import imaplib
 import logging
 import re
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from email.header import decode_header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
-import aiosmtplib
+from sqlalchemy import insert, select, update, bindparam, func
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 
 from app.config import settings
 from app.database import AsyncSessionLocal
+from app.models.ai_job import AiJob
 from app.models.chat_message import ChatMessage
+from app.models.email_attachment import EmailAttachment
 from app.models.ticket import Ticket
-from app.services.ai_service import analyze_ticket_with_ai
+from app.services import near_dup
+from app.services.extractor import extract_fields
+from app.services.imap_listener import ImapListener, FetchedMail, MailBatch
+from app.services.smtp_pool import smtp_pool
 
 logger = logging.getLogger(__name__)
 
 # Ищем [#123] или #123 в теме письма для связи с существующей заявкой
 _TICKET_ID_RE = re.compile(r'\[?#(\d+)\]?')
 
+CHAT_REPLY_SUBJECT = "Ответ на ваше обращение"
+
 
 def _decode_header_value(value: str | None) -> str:
     if not value:
@@ -40,66 +47,61 @@ def _parse_ticket_id(subject: str) -> int | None:
     return int(m.group(1)) if m else None
 
 
-def _fetch_unseen_emails() -> list[dict]:
-    """Sync IMAP fetch — runs in a thread executor."""
-    if not settings.IMAP_HOST or not settings.EMAIL_USER or not settings.EMAIL_PASSWORD:
-        logger.warning("IMAP not configured, skipping email fetch")
-        return []
-
-    messages = []
-    try:
-        with imaplib.IMAP4_SSL(settings.IMAP_HOST, settings.IMAP_PORT) as imap:
-            imap.login(settings.EMAIL_USER, settings.EMAIL_PASSWORD)
-            imap.select("INBOX")
-            _, id_list = imap.search(None, "UNSEEN")
-
-            for msg_id in id_list[0].split():
-                _, data = imap.fetch(msg_id, "(RFC822)")
-                raw = data[0][1]
-                msg = email.message_from_bytes(raw)
-
-                subject = _decode_header_value(msg.get("Subject"))
-                from_ = _decode_header_value(msg.get("From"))
-
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain":
-                            payload = part.get_payload(decode=True)
-                            if payload:
-                                body = payload.decode(
-                                    part.get_content_charset() or "utf-8",
-                                    errors="replace",
-                                )
-                                break
-                else:
-                    payload = msg.get_payload(decode=True)
-                    if payload:
-                        body = payload.decode(
-                            msg.get_content_charset() or "utf-8",
-                            errors="replace",
-                        )
-
-                sender_email = from_
-                if "<" in from_ and ">" in from_:
-                    sender_email = from_.split("<")[1].rstrip(">").strip()
-
-                reply_ticket_id = _parse_ticket_id(subject)
-
-                imap.store(msg_id, "+FLAGS", "\\Seen")
-
-                messages.append({
-                    "subject": subject,
-                    "from": from_,
-                    "email": sender_email,
-                    "body": body,
-                    "date": datetime.now(timezone.utc),
-                    "reply_ticket_id": reply_ticket_id,
-                })
-    except Exception as e:
-        logger.error(f"IMAP error: {e}")
-
-    return messages
+def _parse_message(mail: FetchedMail) -> dict:
+    msg = email.message_from_bytes(mail.raw)
+
+    subject = _decode_header_value(msg.get("Subject"))
+    from_ = _decode_header_value(msg.get("From"))
+
+    body = ""
+    if mail.body is not None:
+        # Текстовая часть уже скачана отдельно, в raw только заголовки
+        body = mail.body
+    elif msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    body = payload.decode(
+                        part.get_content_charset() or "utf-8",
+                        errors="replace",
+                    )
+                    break
+    else:
+        payload = msg.get_payload(decode=True)
+        if payload:
+            body = payload.decode(
+                msg.get_content_charset() or "utf-8",
+                errors="replace",
+            )
+
+    sender_email = from_
+    if "<" in from_ and ">" in from_:
+        sender_email = from_.split("<")[1].rstrip(">").strip()
+
+    return {
+        "subject": subject,
+        "from": from_,
+        "email": sender_email,
+        "body": body,
+        "date": datetime.now(timezone.utc),
+        "reply_ticket_id": _parse_ticket_id(subject),
+        "attachments": [
+            {
+                **att,
+                "filename": _decode_header_value(att["filename"]) or None,
+                "mailbox": mail.mailbox,
+                "uidvalidity": mail.uidvalidity,
+                "uid": mail.uid,
+            }
+            for att in mail.attachments
+        ],
+    }
+
+
+def _add_attachments(session, ticket_id: int, msg: dict) -> None:
+    for att in msg.get("attachments", []):
+        session.add(EmailAttachment(ticket_id=ticket_id, **att))
 
 
 async def _handle_email_reply(msg: dict, ticket_id: int) -> None:
@@ -110,6 +112,7 @@ async def _handle_email_reply(msg: dict, ticket_id: int) -> None:
             return
 
         session.add(ChatMessage(ticket_id=ticket_id, role="user", text=msg["body"]))
+        _add_attachments(session, ticket_id, msg)
 
         if "вызвать оператора" in msg["body"].lower():
             t.status = "needs_operator"
@@ -119,81 +122,267 @@ async def _handle_email_reply(msg: dict, ticket_id: int) -> None:
     logger.info(f"Added client reply to ticket #{ticket_id}")
 
 
-async def _handle_new_email(msg: dict) -> None:
-    """Create new ticket, run AI, populate chat, email AI response."""
-    ticket_id: int
+def _local_fields(text: str) -> dict:
+    """Serials, device type and phone from the regex extractor — visible before the AI job runs."""
+    extracted = extract_fields(text)
+    return {
+        "device_serials": extracted["device_serials"],
+        "device_type": extracted["device_type"],
+        "phone": extracted["phone"],
+    }
+
+
+# Оценки AI-анализа, которые почти-дубликат наследует от исходной заявки. ФИО и организацию —
+# нет: их дубликат получает из собственного письма, чужие данные клиента не копируем
+_INHERITED_FIELDS = ("sentiment", "category", "ai_response", "summary")
+
+
+def _sender(m: dict) -> str | None:
+    return (m.get("email") or "").strip().lower() or None
+
+
+async def _find_near_duplicates(session, msgs: list[dict]) -> list[dict]:
+    """MinHash/LSH signatures for new emails and the ticket each one near-duplicates, if any.
+
+    Only tickets from the same sender are candidates: a form letter or a common
+    fault description from another customer is a new request, not a follow-up.
+    Candidates come from one GIN lookup on lsh_bands over the senders' recent
+    tickets, plus earlier emails of the same sender in the batch; the best
+    signature match above NEAR_DUP_THRESHOLD wins. Returns per message: minhash,
+    lsh_bands, and either `duplicate_of` (existing ticket row) or
+    `duplicate_in_batch` (index into msgs).
+    """
+    # Чистый Python по всем шинглам — считаем вне event loop
+    signatures = await asyncio.to_thread(
+        lambda: [near_dup.minhash(f"{m['subject']}\n{m['body']}") for m in msgs]
+    )
+    found = [
+        {
+            "minhash": signature,
+            "lsh_bands": near_dup.lsh_bands(signature) if signature else None,
+            "duplicate_of": None,
+            "duplicate_in_batch": None,
+        }
+        for signature in signatures
+    ]
+    if not settings.NEAR_DUP_ENABLED:
+        return found
+
+    all_bands = list({key for m, f in zip(msgs, found) if _sender(m) for key in f["lsh_bands"] or []})
+    if not all_bands:
+        return found
+    senders = list({_sender(m) for m in msgs if _sender(m)})
+    window_start = datetime.now(timezone.utc) - timedelta(days=settings.NEAR_DUP_WINDOW_DAYS)
+    result = await session.execute(
+        select(
+            Ticket.id, Ticket.minhash, Ticket.lsh_bands, func.lower(Ticket.email).label("sender"),
+            *(getattr(Ticket, f) for f in _INHERITED_FIELDS),
+        )
+        .where(
+            Ticket.lsh_bands.overlap(all_bands),
+            func.lower(Ticket.email).in_(senders),
+            Ticket.date_received >= window_start,
+            Ticket.duplicate_of.is_(None),
+        )
+    )
+    by_band: dict[tuple[str, int], list] = {}
+    for row in result.all():
+        for key in row.lsh_bands:
+            by_band.setdefault((row.sender, key), []).append(row)
+
+    for i, (m, f) in enumerate(zip(msgs, found)):
+        sender = _sender(m)
+        if not f["minhash"] or not sender:
+            continue
+        best, best_score = None, settings.NEAR_DUP_THRESHOLD
+        for row in {r.id: r for key in f["lsh_bands"] for r in by_band.get((sender, key), [])}.values():
+            score = near_dup.similarity(f["minhash"], row.minhash)
+            if score >= best_score:
+                best, best_score = row, score
+        if best is not None:
+            f["duplicate_of"] = best
+            continue
+        # Письмо и его пересылка часто приходят в одной пачке
+        for j in range(i):
+            other = found[j]
+            if (_sender(msgs[j]) == sender
+                    and other["minhash"] and other["duplicate_of"] is None and other["duplicate_in_batch"] is None
+                    and set(f["lsh_bands"]) & set(other["lsh_bands"])
+                    and near_dup.similarity(f["minhash"], other["minhash"]) >= settings.NEAR_DUP_THRESHOLD):
+                f["duplicate_in_batch"] = j
+                break
+    return found
+
+
+async def _ingest_new_emails(msgs: list[dict]) -> list[int]:
+    """Create tickets for new emails in a single transaction.
+
+    Tickets go in as one multi-row INSERT ... RETURNING id; the client's message
+    in chat, attachment references and AI jobs follow as executemany inserts.
+    The AI job later posts the bot reply to chat and emails it to the client.
+    Near-duplicates of the same sender's recent tickets get `duplicate_of` and the original's
+    analysis instead of an AI job of their own.
+    """
+    texts = [f"От: {m['from']}\nТема: {m['subject']}\n\n{m['body']}" for m in msgs]
 
     async with AsyncSessionLocal() as session:
-        ticket = Ticket(
-            date_received=msg["date"],
-            email=msg["email"],
-            original_email=f"От: {msg['from']}\nТема: {msg['subject']}\n\n{msg['body']}",
-            status="open",
+        dups = await _find_near_duplicates(session, msgs)
+        rows = []
+        for m, text, dup in zip(msgs, texts, dups):
+            row = {
+                "date_received": m["date"],
+                "email": m["email"],
+                "original_email": text,
+                "status": "open",
+                "minhash": dup["minhash"],
+                "lsh_bands": dup["lsh_bands"],
+                **_local_fields(text),
+            }
+            # Ключи у всех строк одинаковые — иначе executemany не соберёт один INSERT
+            original = dup["duplicate_of"]
+            row["duplicate_of"] = original.id if original is not None else None
+            row.update({f: getattr(original, f) if original is not None else None for f in _INHERITED_FIELDS})
+            rows.append(row)
+
+        result = await session.execute(insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True), rows)
+        ticket_ids = list(result.scalars())
+
+        in_batch = [
+            {"b_id": tid, "b_duplicate_of": ticket_ids[dup["duplicate_in_batch"]]}
+            for tid, dup in zip(ticket_ids, dups) if dup["duplicate_in_batch"] is not None
+        ]
+        if in_batch:
+            tickets = Ticket.__table__
+            await session.execute(
+                update(tickets)
+                .where(tickets.c.id == bindparam("b_id"))
+                .values(duplicate_of=bindparam("b_duplicate_of")),
+                in_batch,
+            )
+
+        await session.execute(
+            insert(ChatMessage),
+            [{"ticket_id": tid, "role": "user", "text": text} for tid, text in zip(ticket_ids, texts)],
         )
-        session.add(ticket)
+        # Дубликаты анализ не запускают: его результат разнесёт задача исходной заявки
+        jobs = [
+            {"ticket_id": tid, "reply_to_client": True}
+            for tid, dup in zip(ticket_ids, dups)
+            if dup["duplicate_of"] is None and dup["duplicate_in_batch"] is None
+        ]
+        if jobs:
+            await session.execute(insert(AiJob), jobs)
+        attachments = [
+            {"ticket_id": tid, **att}
+            for tid, m in zip(ticket_ids, msgs)
+            for att in m.get("attachments", [])
+        ]
+        if attachments:
+            await session.execute(insert(EmailAttachment), attachments)
         await session.commit()
-        await session.refresh(ticket)
-        ticket_id = ticket.id
-        ticket_text = ticket.original_email
-
-    try:
-        ai_result = await analyze_ticket_with_ai(ticket_text)
-
-        async with AsyncSessionLocal() as session:
-            t = await session.get(Ticket, ticket_id)
-            if t:
-                t.sentiment = ai_result.get("sentiment")
-                t.category = ai_result.get("category")
-                t.ai_response = ai_result.get("draft_response")
-                t.full_name = ai_result.get("full_name")
-                t.company = ai_result.get("company")
-                t.phone = ai_result.get("phone")
-                t.device_serials = ai_result.get("device_serials") or []
-                t.device_type = ai_result.get("device_type")
-                t.summary = ai_result.get("summary")
-                await session.commit()
-
-        draft = ai_result.get("draft_response", "")
-        bot_text = draft + "\n\n💡 Если нужно вызвать оператора, напишите — вызвать оператора"
-
-        async with AsyncSessionLocal() as session:
-            session.add(ChatMessage(
-                ticket_id=ticket_id,
-                role="user",
-                text=f"От: {msg['from']}\nТема: {msg['subject']}\n\n{msg['body']}",
-            ))
-            session.add(ChatMessage(ticket_id=ticket_id, role="bot", text=bot_text))
-            await session.commit()
-
-        if msg.get("email"):
-            await send_chat_message_to_client(msg["email"], bot_text, ticket_id)
-
-    except Exception as e:
-        logger.error(f"Error processing new email → ticket #{ticket_id}: {e}")
-
-
-async def poll_imap_once() -> None:
-    """Fetch unseen emails, route to new-ticket or reply handler."""
-    loop = asyncio.get_event_loop()
-    messages = await loop.run_in_executor(None, _fetch_unseen_emails)
-
-    if not messages:
-        return
 
-    logger.info(f"Fetched {len(messages)} new email(s)")
+    duplicates = len(ticket_ids) - len(jobs)
+    logger.info(
+        f"Created ticket(s) {', '.join(f'#{tid}' for tid in ticket_ids)}, AI analysis queued"
+        + (f", {duplicates} near-duplicate(s) linked without analysis" if duplicates else "")
+    )
+    return ticket_ids
+
+
+def _is_transient(e: Exception) -> bool:
+    # БД или сеть недоступны: письмо не битое, его надо обработать позже, а не пропустить
+    return isinstance(e, (OperationalError, InterfaceError, OSError, TimeoutError)) or (
+        isinstance(e, DBAPIError) and e.connection_invalidated
+    )
+
 
+async def _ingest_batch(msgs: list[dict], sem: asyncio.Semaphore) -> None:
+    """Bulk-ingest new emails; if the batch fails, retry one by one so a bad message doesn't sink the rest.
+
+    Transient failures (DB or network down) are raised, not skipped: the listener
+    then keeps the UIDs unprocessed and fetches them again.
+    """
+    async with sem:
+        try:
+            await _ingest_new_emails(msgs)
+            return
+        except Exception as e:
+            if _is_transient(e):
+                raise
+            if len(msgs) == 1:
+                logger.error(f"Failed to handle email '{msgs[0].get('subject')}' from {msgs[0].get('email')}: {e}")
+                return
+            logger.warning(f"Bulk ingestion of {len(msgs)} emails failed ({e}), retrying one by one")
+    for msg in msgs:
+        await _ingest_batch([msg], sem)
+
+
+async def _handle_reply_chain(chain: list[dict], sem: asyncio.Semaphore) -> None:
+    """Replies to one ticket are handled in arrival order; a bad message affects only itself.
+
+    A transient failure stops the chain and is raised, so later replies are not
+    added ahead of the one that will be fetched again.
+    """
+    for msg in chain:
+        async with sem:
+            try:
+                await _handle_email_reply(msg, msg["reply_ticket_id"])
+            except Exception as e:
+                if _is_transient(e):
+                    raise
+                logger.error(f"Failed to handle email '{msg.get('subject')}' from {msg.get('email')}: {e}")
+
+
+def _group_replies(messages: list[dict]) -> list[list[dict]]:
+    """Replies to the same [#id] go into one chain."""
+    chains: dict[int, list[dict]] = {}
     for msg in messages:
-        reply_ticket_id = msg.get("reply_ticket_id")
-        if reply_ticket_id:
-            await _handle_email_reply(msg, reply_ticket_id)
-        else:
-            await _handle_new_email(msg)
+        chains.setdefault(msg["reply_ticket_id"], []).append(msg)
+    return list(chains.values())
+
+
+async def process_messages(messages: list[dict], concurrency: int | None = None) -> None:
+    """Handle fetched emails: new ones in bulk batches, replies concurrently, at most `concurrency` at a time.
+
+    Raises the first transient failure once every handler has finished.
+    """
+    sem = asyncio.Semaphore(concurrency or settings.EMAIL_PROCESS_CONCURRENCY)
+    new = [m for m in messages if not m.get("reply_ticket_id")]
+    replies = [m for m in messages if m.get("reply_ticket_id")]
+    batch_size = settings.EMAIL_INGEST_BATCH
+    # Дожидаемся всех обработчиков: иначе при ошибке одного остальные доработали бы в фоне
+    results = await asyncio.gather(
+        *(_ingest_batch(new[i:i + batch_size], sem) for i in range(0, len(new), batch_size)),
+        *(_handle_reply_chain(chain, sem) for chain in _group_replies(replies)),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def _on_new_mail(batch: MailBatch) -> None:
+    """Parse a batch fetched by the IMAP listener and route it to handlers."""
+    messages = []
+    for mail in batch:
+        try:
+            messages.append(_parse_message(mail))
+        except Exception as e:
+            logger.error(f"Failed to parse email UID {mail.uid}: {e}")
+
+    logger.info(f"Fetched {len(messages)} new email(s)")
+    await process_messages(messages)
 
 
 async def send_email_response(
-    to_email: str, subject: str, body: str, ticket_id: int | None = None
+    to_email: str, subject: str, body: str, ticket_id: int | None = None,
+    message_id_key: str | None = None,
 ) -> None:
-    """Send email via SMTP. Embeds ticket ID in subject for thread tracking."""
+    """Send email via SMTP. Embeds ticket ID in subject for thread tracking.
+
+    `message_id_key` makes the Message-ID deterministic, so a retried send is
+    recognised as the same message by the recipient's mail server.
+    """
     if not settings.SMTP_HOST or not settings.EMAIL_USER or not settings.EMAIL_PASSWORD:
         raise RuntimeError("SMTP не настроен — задайте SMTP_HOST, EMAIL_USER, EMAIL_PASSWORD")
 
@@ -204,30 +393,28 @@ async def send_email_response(
     msg["Subject"] = subject
     msg["From"] = settings.EMAIL_USER
     msg["To"] = to_email
+    if message_id_key:
+        domain = settings.EMAIL_USER.split("@")[-1]
+        msg["Message-ID"] = f"<{message_id_key}@{domain}>"
     msg.attach(MIMEText(body, "plain", "utf-8"))
 
-    await aiosmtplib.send(
-        msg,
-        hostname=settings.SMTP_HOST,
-        port=settings.SMTP_PORT,
-        username=settings.EMAIL_USER,
-        password=settings.EMAIL_PASSWORD,
-        start_tls=True,
-    )
+    await smtp_pool.send(msg)
     logger.info(f"Email sent to {to_email} (ticket #{ticket_id})")
 
 
 async def send_chat_message_to_client(to_email: str, text: str, ticket_id: int) -> None:
     """Send a chat message to client's email with ticket ID in subject."""
-    await send_email_response(to_email, "Ответ на ваше обращение", text, ticket_id)
+    await send_email_response(to_email, CHAT_REPLY_SUBJECT, text, ticket_id)
 
 
 async def start_email_polling(interval: int = 60) -> None:
-    """Infinite async loop — polls IMAP every `interval` seconds."""
-    logger.info(f"Email polling started (interval={interval}s)")
-    while True:
-        try:
-            await poll_imap_once()
-        except Exception as e:
-            logger.error(f"Email polling iteration error: {e}")
-        await asyncio.sleep(interval)
+    """Keep an IMAP IDLE connection open and handle new mail as it arrives.
+
+    `interval` is used only when the server does not support IDLE.
+    """
+    if not settings.IMAP_HOST or not settings.EMAIL_USER or not settings.EMAIL_PASSWORD:
+        logger.warning("IMAP not configured, email ingestion disabled")
+        return
+
+    logger.info("Email listener started")
+    await ImapListener(_on_new_mail, poll_interval=interval).run()
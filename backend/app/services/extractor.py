@@ -0,0 +1,62 @@
+import re
+
+# Заводской номер — 9 цифр подряд, не часть более длинного числа
+_SERIAL_RE = re.compile(r"(?<![\d+])\d{9}(?!\d)")
+# Реквизиты организации тоже бывают из 9 цифр (КПП, БИК). Число сразу после такой метки —
+# в том числе вторым в «ИНН/КПП 7701234567/770101001» — не заводской номер
+_REQUISITE_RE = re.compile(
+    r"(?:ИНН|КПП|БИК|ОГРНИП|ОГРН|ОКПО|[рк]/с|[рк]/сч|сч[её]т)\W*(?:\d+\W*){0,3}$", re.IGNORECASE
+)
+_REQUISITE_WINDOW = 40
+# Тип прибора, названный в тексте явно: «ДГС ЭРИС-230», «ЭРИС 230», «эрис-124»
+_DEVICE_TYPE_RE = re.compile(r"(?:ДГС\s*)?ЭРИС[\s-]*(\d{3})\b", re.IGNORECASE)
+# Российские номера: +7 / 8, затем 10 цифр с пробелами, скобками и дефисами
+_PHONE_RE = re.compile(r"(?<!\d)(?:\+7|8)[\s(-]*\d{3}[\s)-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}(?!\d)")
+
+# Код модели (первые три цифры заводского номера) → тип прибора.
+# По номеру тип определяется только для известных кодов; незнакомый код, названный
+# в тексте явно («ЭРИС-310»), именуется по тому же правилу «ДГС ЭРИС-<код>».
+MODEL_CODES = {
+    "124": "ДГС ЭРИС-124",
+    "230": "ДГС ЭРИС-230",
+}
+
+
+def model_name(code: str) -> str:
+    return MODEL_CODES.get(code, f"ДГС ЭРИС-{code}")
+
+
+def _serials(text: str) -> list[str]:
+    serials = []
+    for m in _SERIAL_RE.finditer(text):
+        if _REQUISITE_RE.search(text, max(0, m.start() - _REQUISITE_WINDOW), m.start()):
+            continue
+        serials.append(m.group(0))
+    return list(dict.fromkeys(serials))
+
+
+def _normalize_phone(raw: str) -> str:
+    digits = re.sub(r"\D", "", raw)
+    return "+7" + digits[-10:]
+
+
+def extract_fields(text: str) -> dict:
+    """Regex extraction of serials, device type and phone.
+
+    Returns the same keys the LLM used to fill: device_serials, device_type, phone.
+    """
+    # Телефон ищем первым и вырезаем, чтобы его цифры не приняли за серийный номер
+    phone_match = _PHONE_RE.search(text)
+    text_wo_phones = _PHONE_RE.sub(" ", text)
+
+    serials = _serials(text_wo_phones)
+
+    named = list(dict.fromkeys(model_name(code) for code in _DEVICE_TYPE_RE.findall(text)))
+    by_serial = list(dict.fromkeys(MODEL_CODES[s[:3]] for s in serials if s[:3] in MODEL_CODES))
+    device_types = named or by_serial
+
+    return {
+        "device_serials": serials,
+        "device_type": ", ".join(device_types) or None,
+        "phone": _normalize_phone(phone_match.group(0)) if phone_match else None,
+    }
@@ -0,0 +1,398 @@
+import asyncio
+import base64
+import logging
+import quopri
+import random
+import re
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import aioimaplib
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.mailbox_state import MailboxState
+
+logger = logging.getLogger(__name__)
+
+_UIDVALIDITY_RE = re.compile(rb"UIDVALIDITY (\d+)")
+_UIDNEXT_RE = re.compile(rb"UIDNEXT (\d+)")
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+_FETCH_START_RE = re.compile(rb"^\d+ FETCH ")
+_ATOM_RE = re.compile(rb'\s*(\(|\)|"((?:[^"\\]|\\.)*)"|[^\s()"]+)')
+
+
+@dataclass
+class FetchedMail:
+    """One new message. In "full" mode `raw` is the whole RFC822 message and `body` is None;
+    in "structure" mode `raw` holds headers only, `body` the decoded text/plain part and
+    `attachments` lazily fetchable references (UID + part number).
+    """
+    uid: int
+    mailbox: str
+    uidvalidity: int
+    raw: bytes
+    body: str | None = None
+    attachments: list[dict] = field(default_factory=list)
+
+
+MailBatch = list[FetchedMail]
+
+
+def _uid_ranges(uids: list[int], batch_size: int) -> list[list[int]]:
+    uids = sorted(uids)
+    return [uids[i:i + batch_size] for i in range(0, len(uids), batch_size)]
+
+
+def _uid_set(uids: list[int]) -> str:
+    """IMAP sequence set of exactly these UIDs; ranges only over contiguous runs (1:3,7,9:10)."""
+    runs = []
+    for uid in sorted(uids):
+        if runs and uid == runs[-1][1] + 1:
+            runs[-1][1] = uid
+        else:
+            runs.append([uid, uid])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in runs)
+
+
+def _parse_search_response(lines: list) -> list[int]:
+    # Пустой результат: первой строкой приходит сразу текст завершения команды
+    return [int(token) for token in lines[0].split() if token.isdigit()] if lines else []
+
+
+def _split_fetch_response(lines: list) -> list[tuple[bytes, list[bytes]]]:
+    """Group FETCH response lines per message: (metadata without literals, literals)."""
+    messages = []
+    for line in lines:
+        if isinstance(line, bytearray):
+            if messages:
+                messages[-1][1].append(bytes(line))
+        elif _FETCH_START_RE.match(line):
+            messages.append((bytearray(line), []))
+        elif messages:
+            messages[-1][0].extend(b" " + line)
+    return [(bytes(meta), literals) for meta, literals in messages]
+
+
+def _fetch_uid(meta: bytes) -> int | None:
+    m = _FETCH_UID_RE.search(meta)
+    return int(m.group(1)) if m else None
+
+
+def _parse_sexp(data: bytes, pos: int = 0) -> tuple[list, int]:
+    """Parse an IMAP parenthesized list starting at data[pos] == '('. NIL → None."""
+    result = []
+    pos += 1
+    while pos < len(data):
+        m = _ATOM_RE.match(data, pos)
+        if not m:
+            break
+        token = m.group(1)
+        if token == b"(":
+            sub, pos = _parse_sexp(data, m.start(1))
+            result.append(sub)
+            continue
+        pos = m.end()
+        if token == b")":
+            return result, pos
+        if m.group(2) is not None:
+            result.append(m.group(2).replace(b'\\"', b'"').decode("utf-8", errors="replace"))
+        elif token.upper() == b"NIL":
+            result.append(None)
+        else:
+            result.append(token.decode("ascii", errors="replace"))
+    raise ValueError("Unbalanced BODYSTRUCTURE")
+
+
+def _params(value) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {str(value[i]).lower(): value[i + 1] for i in range(0, len(value) - 1, 2)}
+
+
+def _walk_bodystructure(node: list, prefix: str = "") -> list[dict]:
+    """Flatten BODYSTRUCTURE into leaf parts with their IMAP part numbers."""
+    if node and isinstance(node[0], list):
+        # Дочерние части идут первыми, за ними subtype и extension-данные
+        parts = []
+        for i, child in enumerate(node, start=1):
+            if not isinstance(child, list):
+                break
+            parts.extend(_walk_bodystructure(child, f"{prefix}.{i}" if prefix else str(i)))
+        return parts
+
+    mime_type = f"{node[0]}/{node[1]}".lower()
+    # Расширенные поля начинаются после size (+lines для text/*, +envelope/body/lines для message/rfc822)
+    ext = 7
+    if mime_type.startswith("text/"):
+        ext = 8
+    elif mime_type == "message/rfc822":
+        ext = 10
+    disposition = node[ext + 1] if len(node) > ext + 1 and isinstance(node[ext + 1], list) else None
+    disposition_params = _params(disposition[1]) if disposition and len(disposition) > 1 else {}
+    type_params = _params(node[2])
+
+    return [{
+        "part": prefix or "TEXT",
+        "mime_type": mime_type,
+        "charset": type_params.get("charset"),
+        "encoding": (node[5] or "7bit").lower(),
+        "size": int(node[6]) if node[6] and str(node[6]).isdigit() else None,
+        "disposition": str(disposition[0]).lower() if disposition and disposition[0] else None,
+        "filename": disposition_params.get("filename") or type_params.get("name"),
+    }]
+
+
+def _pick_parts(parts: list[dict]) -> tuple[dict | None, list[dict]]:
+    """text/plain body part and attachment parts."""
+    body = None
+    attachments = []
+    for p in parts:
+        is_attachment = p["disposition"] == "attachment" or p["filename"] or not p["mime_type"].startswith("text/")
+        if is_attachment:
+            attachments.append(p)
+        elif body is None and p["mime_type"] == "text/plain":
+            body = p
+    return body, attachments
+
+
+def decode_transfer_encoding(data: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        data = b"".join(data.split())
+        # Частичный FETCH мог обрезать последнюю группу
+        return base64.b64decode(data[:len(data) // 4 * 4])
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+
+async def _open_connection() -> aioimaplib.IMAP4_SSL:
+    imap = aioimaplib.IMAP4_SSL(settings.IMAP_HOST, settings.IMAP_PORT, timeout=settings.IMAP_TIMEOUT)
+    await imap.wait_hello_from_server()
+    response = await imap.login(settings.EMAIL_USER, settings.EMAIL_PASSWORD)
+    if response.result != "OK":
+        raise RuntimeError(f"IMAP login failed: {response.result}")
+    return imap
+
+
+async def fetch_attachment(mailbox: str, uidvalidity: int, uid: int, part: str, encoding: str) -> bytes:
+    """Download one MIME part on demand over a short-lived connection."""
+    if not settings.IMAP_HOST or not settings.EMAIL_USER or not settings.EMAIL_PASSWORD:
+        raise RuntimeError("IMAP не настроен — задайте IMAP_HOST, EMAIL_USER, EMAIL_PASSWORD")
+
+    imap = await _open_connection()
+    try:
+        response = await imap.examine(mailbox)
+        status = b" ".join(line for line in response.lines if isinstance(line, bytes))
+        m = _UIDVALIDITY_RE.search(status)
+        if response.result != "OK" or not m or int(m.group(1)) != uidvalidity:
+            raise LookupError("Почтовый ящик пересоздан, вложение больше недоступно")
+
+        response = await imap.uid("fetch", str(uid), f"(BODY.PEEK[{part}])")
+        for meta, literals in _split_fetch_response(response.lines):
+            if _fetch_uid(meta) == uid and literals:
+                return decode_transfer_encoding(literals[0], encoding)
+        raise LookupError("Письмо с вложением удалено из ящика")
+    finally:
+        try:
+            await asyncio.wait_for(imap.logout(), timeout=5)
+        except Exception:
+            pass
+
+
+class ImapListener:
+    """Long-lived IMAP connection: IDLE push, UID-based incremental fetch, reconnect with backoff.
+
+    Position in the mailbox (UIDVALIDITY + last processed UID) is stored in
+    `mailbox_state`, so a restart resumes where the previous process stopped.
+    A chunk's UIDs are committed and flagged \\Seen only after `on_messages`
+    returns, so delivery is at-least-once.
+    """
+
+    def __init__(self, on_messages: Callable[[MailBatch], Awaitable[None]], mailbox: str = "INBOX",
+                 poll_interval: int = 60):
+        self.on_messages = on_messages
+        self.mailbox = mailbox
+        self.poll_interval = poll_interval
+        self.imap: aioimaplib.IMAP4_SSL | None = None
+        self.uidvalidity: int | None = None
+        self.last_uid = 0
+
+    async def run(self) -> None:
+        failures = 0
+        while True:
+            try:
+                await self._connect()
+                failures = 0
+                await self._listen()
+            except asyncio.CancelledError:
+                await self._disconnect()
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(settings.IMAP_RECONNECT_MAX_DELAY, 2 ** failures) * random.uniform(0.5, 1.0)
+                logger.error(f"IMAP connection error: {e}, reconnecting in {delay:.0f}s")
+                await self._disconnect()
+                await asyncio.sleep(delay)
+
+    async def _connect(self) -> None:
+        self.imap = await _open_connection()
+        response = await self.imap.select(self.mailbox)
+        if response.result != "OK":
+            raise RuntimeError(f"IMAP select {self.mailbox} failed: {response.result}")
+        status = b" ".join(line for line in response.lines if isinstance(line, bytes))
+        uidvalidity = int(_UIDVALIDITY_RE.search(status).group(1))
+        uidnext_match = _UIDNEXT_RE.search(status)
+        logger.info(f"IMAP connected to {settings.IMAP_HOST}/{self.mailbox} (UIDVALIDITY={uidvalidity})")
+
+        await self._load_state(uidvalidity, int(uidnext_match.group(1)) if uidnext_match else None)
+
+    async def _disconnect(self) -> None:
+        if self.imap is None:
+            return
+        try:
+            await asyncio.wait_for(self.imap.logout(), timeout=5)
+        except Exception:
+            pass
+        self.imap = None
+
+    async def _load_state(self, uidvalidity: int, uidnext: int | None) -> None:
+        async with AsyncSessionLocal() as session:
+            state = await session.get(MailboxState, self.mailbox)
+            if state and state.uidvalidity == uidvalidity:
+                self.uidvalidity, self.last_uid = uidvalidity, state.last_uid
+                return
+
+        # Первый запуск или ящик пересоздан (UIDVALIDITY сменился): старые UID недействительны.
+        # Разбираем непрочитанное, а дальше идём только по UID.
+        logger.warning(f"IMAP {self.mailbox}: no valid sync state, processing UNSEEN backlog")
+        self.uidvalidity = uidvalidity
+        response = await self.imap.uid_search("UNSEEN")
+        unseen = _parse_search_response(response.lines) if response.result == "OK" else []
+        await self._fetch_and_process(unseen)
+        if uidnext:
+            self.last_uid = max(self.last_uid, uidnext - 1)
+        await self._save_state()
+
+    async def _save_state(self) -> None:
+        async with AsyncSessionLocal() as session:
+            state = await session.get(MailboxState, self.mailbox)
+            if state is None:
+                state = MailboxState(mailbox=self.mailbox)
+                session.add(state)
+            state.uidvalidity = self.uidvalidity
+            state.last_uid = self.last_uid
+            await session.commit()
+
+    async def _sync(self) -> None:
+        """Fetch everything above the last processed UID."""
+        response = await self.imap.uid_search(f"UID {self.last_uid + 1}:*")
+        if response.result != "OK":
+            raise RuntimeError(f"IMAP UID SEARCH failed: {response.result}")
+        # `n:*` всегда возвращает последнее письмо, даже если его UID < n
+        new_uids = [uid for uid in _parse_search_response(response.lines) if uid > self.last_uid]
+        await self._fetch_and_process(new_uids)
+
+    async def _fetch_and_process(self, uids: list[int]) -> None:
+        for chunk in _uid_ranges(uids, settings.IMAP_FETCH_BATCH):
+            # Не диапазон first:last: в UNSEEN-бэклоге между непрочитанными лежат уже прочитанные письма
+            uid_set = _uid_set(chunk)
+            if settings.IMAP_FETCH_MODE == "full":
+                batch = await self._fetch_full(uid_set)
+            else:
+                batch = await self._fetch_structure(uid_set, set(chunk))
+            batch = [mail for mail in batch if mail.uid in chunk]
+            if batch:
+                # Ошибка обработчика (например, БД недоступна) уходит в run(): позиция не сдвигается,
+                # \Seen не ставится, после переподключения порция скачивается заново
+                await self.on_messages(batch)
+            self.last_uid = max(self.last_uid, chunk[-1])
+            await self._save_state()
+            if batch:
+                await self.imap.uid("store", uid_set, "+FLAGS.SILENT (\\Seen)")
+
+    async def _uid_fetch(self, uid_set: str, items: str) -> list[tuple[bytes, list[bytes]]]:
+        response = await self.imap.uid("fetch", uid_set, items)
+        if response.result != "OK":
+            raise RuntimeError(f"IMAP UID FETCH {uid_set} {items} failed: {response.result}")
+        return _split_fetch_response(response.lines)
+
+    async def _fetch_full(self, uid_set: str) -> MailBatch:
+        return [
+            FetchedMail(uid=_fetch_uid(meta), mailbox=self.mailbox, uidvalidity=self.uidvalidity, raw=literals[0])
+            for meta, literals in await self._uid_fetch(uid_set, "(RFC822)")
+            if _fetch_uid(meta) and literals
+        ]
+
+    async def _fetch_structure(self, uid_set: str, wanted: set[int]) -> MailBatch:
+        """Headers + BODYSTRUCTURE first, then only the text/plain part of each requested message."""
+        mails: dict[int, FetchedMail] = {}
+        body_parts: dict[int, dict] = {}
+        full_uids: list[int] = []
+
+        for meta, literals in await self._uid_fetch(uid_set, "(BODYSTRUCTURE BODY.PEEK[HEADER])"):
+            uid = _fetch_uid(meta)
+            # Сервер может прислать и непрошеные FETCH-ответы — тексты качаем только для запрошенных UID
+            if uid not in wanted or not literals:
+                continue
+            try:
+                start = meta.index(b"BODYSTRUCTURE ") + len(b"BODYSTRUCTURE ")
+                structure, _ = _parse_sexp(meta, start)
+                body_part, attachments = _pick_parts(_walk_bodystructure(structure))
+            except ValueError:
+                # Литерал внутри BODYSTRUCTURE или нестандартный ответ — берём письмо целиком
+                full_uids.append(uid)
+                continue
+            mails[uid] = FetchedMail(
+                uid=uid, mailbox=self.mailbox, uidvalidity=self.uidvalidity, raw=literals[0], body="",
+                attachments=[{k: p[k] for k in ("part", "mime_type", "encoding", "size", "filename")}
+                             for p in attachments],
+            )
+            if body_part:
+                body_parts[uid] = body_part
+
+        # Один UID FETCH на каждый номер части: у большинства писем текст лежит в "1" или "1.1"
+        by_part: dict[str, list[int]] = {}
+        for uid, p in body_parts.items():
+            by_part.setdefault(p["part"], []).append(uid)
+        for part, part_uids in by_part.items():
+            section = f"BODY.PEEK[{part}]<0.{settings.IMAP_MAX_BODY_BYTES}>"
+            for meta, literals in await self._uid_fetch(",".join(map(str, part_uids)), f"({section})"):
+                uid = _fetch_uid(meta)
+                if uid not in body_parts or not literals:
+                    continue
+                p = body_parts[uid]
+                payload = decode_transfer_encoding(literals[0], p["encoding"])
+                mails[uid].body = payload.decode(p["charset"] or "utf-8", errors="replace")
+
+        if full_uids:
+            mails.update({m.uid: m for m in await self._fetch_full(",".join(map(str, full_uids)))})
+        return [mails[uid] for uid in sorted(mails)]
+
+    async def _listen(self) -> None:
+        idle_supported = self.imap.has_capability("IDLE")
+        if not idle_supported:
+            logger.warning("IMAP server has no IDLE, falling back to polling on the open connection")
+
+        while True:
+            await self._sync()
+            if idle_supported:
+                await self._wait_idle()
+            else:
+                await asyncio.sleep(self.poll_interval)
+                await self.imap.noop()
+
+    async def _wait_idle(self) -> None:
+        """Block in IDLE until the server reports new mail or the IDLE timeout expires."""
+        idle = await self.imap.idle_start(timeout=settings.IMAP_IDLE_TIMEOUT)
+        try:
+            while self.imap.has_pending_idle():
+                push = await self.imap.wait_server_push()
+                if not isinstance(push, list):
+                    break  # IDLE завершён по таймауту — переоткрываем
+                if any(isinstance(line, bytes) and line.endswith(b"EXISTS") for line in push):
+                    break
+        finally:
+            if self.imap.has_pending_idle():
+                self.imap.idle_done()
+            await asyncio.wait_for(idle, timeout=settings.IMAP_TIMEOUT)
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import io
+import logging
+import re
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from xml.etree import ElementTree
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.knowledge_base import KbChunk, KbFile
+from app.services.tokens import CHARS_PER_TOKEN, estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+")
+
+_model = None
+_model_lock = threading.Lock()
+_model_retry_at = 0.0   # time.monotonic(), до которого модель не пытаемся загрузить снова
+
+
+class EmbeddingModelUnavailable(RuntimeError):
+    """The embedding model failed to load recently; calls fail fast until the backoff expires."""
+
+
+# ── Извлечение текста ─────────────────────────────────
+def _docx_text(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        root = ElementTree.fromstring(z.read("word/document.xml"))
+    return "\n\n".join(
+        "".join(t.text or "" for t in p.iter(f"{_WORD_NS}t"))
+        for p in root.iter(f"{_WORD_NS}p")
+    )
+
+
+def _pdf_text(data: bytes) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_text(data: bytes, suffix: str, mime_type: str | None) -> str:
+    """Plain text of a KB file; raises ValueError for unsupported formats."""
+    suffix = suffix.lower()
+    if suffix == ".pdf" or mime_type == "application/pdf":
+        return _pdf_text(data)
+    if suffix == ".docx":
+        return _docx_text(data)
+    if suffix in (".txt", ".md", ".csv") or (mime_type or "").startswith("text/"):
+        return data.decode("utf-8", errors="replace")
+    raise ValueError(f"unsupported KB file format: {suffix or mime_type}")
+
+
+def chunk_text(text: str, chunk_tokens: int | None = None) -> list[str]:
+    """Paragraph-aligned chunks of about `chunk_tokens`; long paragraphs are split by sentences."""
+    limit = (chunk_tokens or settings.KB_CHUNK_TOKENS) * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in _PARAGRAPH_SPLIT_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= limit:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_SPLIT_RE.split(paragraph):
+            pieces.extend(sentence[i:i + limit] for i in range(0, len(sentence), limit))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ── Эмбеддинги ────────────────────────────────────────
+def _embedder():
+    global _model, _model_retry_at
+    if _model is not None:
+        return _model
+    # Проверка до захвата лока: пока загрузка в backoff, вызовы не ждут друг друга
+    if time.monotonic() < _model_retry_at:
+        raise EmbeddingModelUnavailable(settings.KB_EMBEDDING_MODEL)
+    with _model_lock:
+        if _model is None:
+            if time.monotonic() < _model_retry_at:
+                raise EmbeddingModelUnavailable(settings.KB_EMBEDDING_MODEL)
+            try:
+                # ONNX-модель на CPU; веса скачиваются при первом вызове и кэшируются на диске
+                from fastembed import TextEmbedding
+
+                _model = TextEmbedding(settings.KB_EMBEDDING_MODEL)
+            except ImportError as e:
+                # Без пакета повторять бессмысленно до перезапуска
+                _model_retry_at = float("inf")
+                raise EmbeddingModelUnavailable(f"fastembed not installed: {e}") from e
+            except Exception as e:
+                # Обычно нет сети для скачивания весов — не повторяем загрузку на каждом запросе к LLM
+                _model_retry_at = time.monotonic() + settings.KB_MODEL_RETRY_SECONDS
+                raise EmbeddingModelUnavailable(f"{settings.KB_EMBEDDING_MODEL}: {e}") from e
+    return _model
+
+
+def embed(texts: list[str]) -> list[list[float]]:
+    """Blocking; call via asyncio.to_thread."""
+    return [vector.tolist() for vector in _embedder().embed(texts)]
+
+
+# ── Индексация ────────────────────────────────────────
+def _resolve(file_path: str) -> Path:
+    path = Path(file_path)
+    return path if path.is_absolute() else Path(settings.KB_FILES_DIR) / path
+
+
+async def _set_index_error(file_id: int, error: str, digest: str | None = None) -> None:
+    values = {"index_error": error[:2000]}
+    async with AsyncSessionLocal() as session:
+        if digest is not None:
+            # Хэш битого файла запоминаем: повторно его не разбираем, пока содержимое не изменится.
+            # Фрагменты прежней версии файла уже не соответствуют ему — убираем их из поиска
+            values["content_hash"] = digest
+            await session.execute(delete(KbChunk).where(KbChunk.file_id == file_id))
+        await session.execute(update(KbFile).where(KbFile.id == file_id).values(**values))
+        await session.commit()
+
+
+async def _embed_file(path: Path, mime_type: str | None, data: bytes) -> tuple[list[str], list[list[float]]]:
+    text = await asyncio.to_thread(extract_text, data, path.suffix, mime_type)
+    chunks = chunk_text(text)
+    vectors = await asyncio.to_thread(embed, chunks) if chunks else []
+    return chunks, vectors
+
+
+async def _store_chunks(file_id: int, chunks: list[str], vectors: list[list[float]], digest: str) -> None:
+    # Старые фрагменты файла заменяются целиком; HNSW-индекс обновляется по строкам
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(KbChunk).where(KbChunk.file_id == file_id))
+        if chunks:
+            await session.execute(
+                insert(KbChunk),
+                [
+                    {"file_id": file_id, "chunk_idx": i, "text": chunk, "embedding": vector}
+                    for i, (chunk, vector) in enumerate(zip(chunks, vectors))
+                ],
+            )
+        await session.execute(
+            update(KbFile)
+            .where(KbFile.id == file_id)
+            .values(content_hash=digest, indexed_at=datetime.now(timezone.utc), index_error=None)
+        )
+        await session.commit()
+
+
+async def index_kb_files() -> dict:
+    """Re-index KB files whose content changed since the last run (by sha256).
+
+    A file that fails extraction or embedding is recorded with its hash and error
+    and skipped until its content changes. A missing file or a DB error is retried
+    on the next pass. If the embedding model is unavailable the pass stops without
+    blaming the files.
+    """
+    stats = {"indexed": 0, "unchanged": 0, "failed": 0, "chunks": 0}
+    async with AsyncSessionLocal() as session:
+        files = (await session.execute(
+            select(KbFile.id, KbFile.file_path, KbFile.mime_type, KbFile.content_hash)
+        )).all()
+
+    for file_id, file_path, mime_type, content_hash in files:
+        path = _resolve(file_path)
+        digest = None   # None — файл не прочитан, ошибку запишем без хэша и повторим
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+            digest = hashlib.sha256(data).hexdigest()
+            if digest == content_hash:
+                stats["unchanged"] += 1
+                continue
+            chunks, vectors = await _embed_file(path, mime_type, data)
+        except EmbeddingModelUnavailable as e:
+            logger.warning(f"KB indexing postponed, embedding model unavailable: {e}")
+            break
+        except Exception as e:
+            stats["failed"] += 1
+            logger.warning(f"KB file #{file_id} ({file_path}) not indexed: {e}")
+            await _set_index_error(file_id, str(e), digest)
+            continue
+
+        try:
+            await _store_chunks(file_id, chunks, vectors, digest)
+        except Exception as e:
+            stats["failed"] += 1
+            logger.warning(f"KB file #{file_id} ({file_path}) not stored: {e}")
+            await _set_index_error(file_id, str(e))
+            continue
+        stats["indexed"] += 1
+        stats["chunks"] += len(chunks)
+    return stats
+
+
+async def run_kb_indexer() -> None:
+    """Background loop: pick up new and changed KB files every KB_INDEX_INTERVAL seconds."""
+    if not settings.KB_RAG_ENABLED:
+        return
+    while True:
+        try:
+            stats = await index_kb_files()
+            if stats["indexed"] or stats["failed"]:
+                logger.info(f"KB index updated: {stats}")
+        except Exception as e:
+            logger.error(f"KB indexing failed: {e}")
+        await asyncio.sleep(settings.KB_INDEX_INTERVAL)
+
+
+# ── Поиск ─────────────────────────────────────────────
+_version: tuple[float, str] | None = None   # (time.monotonic() проверки, отпечаток)
+
+
+async def index_version() -> str:
+    """Fingerprint of the KB index: number of files and the last indexing time.
+
+    Goes into the analysis cache key instead of the retrieved fragments, so a
+    cache hit costs neither an embedding nor a vector query. Re-read from the DB
+    at most every KB_VERSION_CHECK_SECONDS; empty when RAG is off.
+    """
+    global _version
+    if not settings.KB_RAG_ENABLED:
+        return ""
+    now = time.monotonic()
+    if _version is not None and now - _version[0] < settings.KB_VERSION_CHECK_SECONDS:
+        return _version[1]
+    try:
+        async with AsyncSessionLocal() as session:
+            count, last_indexed = (await session.execute(
+                select(func.count(KbFile.id), func.max(KbFile.indexed_at))
+            )).one()
+    except Exception as e:
+        logger.warning(f"KB index version lookup failed: {e}")
+        return _version[1] if _version is not None else ""
+    _version = (now, f"{count}@{last_indexed.isoformat() if last_indexed else '-'}")
+    return _version[1]
+
+
+async def retrieve(query: str) -> str | None:
+    """Top-k KB fragments closest to `query`, packed into KB_CONTEXT_TOKENS; None if nothing relevant.
+
+    Never raises: without the embedding model or the index the prompts just go without KB context.
+    """
+    if not settings.KB_RAG_ENABLED or time.monotonic() < _model_retry_at or not query.strip():
+        return None
+
+    try:
+        vector = (await asyncio.to_thread(embed, [truncate_to_tokens(query, settings.KB_CHUNK_TOKENS * 2)]))[0]
+    except EmbeddingModelUnavailable as e:
+        logger.error(f"KB retrieval skipped, embedding model unavailable: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"KB query embedding failed: {e}")
+        return None
+
+    distance = KbChunk.embedding.cosine_distance(vector)
+    try:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(KbChunk.text, KbFile.title, distance.label("distance"))
+                .join(KbFile, KbFile.id == KbChunk.file_id)
+                .order_by(distance)
+                .limit(settings.KB_TOP_K)
+            )).all()
+    except Exception as e:
+        logger.warning(f"KB retrieval failed: {e}")
+        return None
+
+    budget = settings.KB_CONTEXT_TOKENS
+    parts = []
+    for text, title, dist in rows:
+        if dist > settings.KB_MAX_DISTANCE:
+            break
+        part = f"[{title}]\n{text}"
+        cost = estimate_tokens(part)
+        if cost > budget:
+            if not parts:
+                parts.append(truncate_to_tokens(part, budget))
+            break
+        budget -= cost
+        parts.append(part)
+    return "\n\n".join(parts) or None
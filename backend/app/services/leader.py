@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+
+import asyncpg
+
+from app.config import settings
+from app.database import asyncpg_dsn
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_key(name: str) -> int:
+    # Ключ advisory lock — bigint; имя роли хэшируется, чтобы разные роли не пересекались
+    return int.from_bytes(hashlib.blake2b(f"eris:{name}".encode(), digest_size=8).digest(), "big", signed=True)
+
+
+async def run_as_leader(name: str, work: Callable[[], Awaitable[None]]) -> None:
+    """Run `work()` in exactly one process across all replicas, until cancelled.
+
+    Leadership is a session-level pg_try_advisory_lock held on a dedicated
+    connection: Postgres releases it when the leader's connection dies, and a
+    standby takes over within LEADER_RETRY_SECONDS. The leader pings its
+    connection every LEADER_CHECK_SECONDS and stops `work` as soon as the ping
+    fails, since the lock may already belong to someone else by then.
+    """
+    key = _lock_key(name)
+    while True:
+        conn = None
+        task = None
+        try:
+            conn = await asyncpg.connect(asyncpg_dsn())
+            if await conn.fetchval("SELECT pg_try_advisory_lock($1)", key):
+                logger.info(f"Leader for {name}")
+                task = asyncio.create_task(work())
+                while not task.done():
+                    await asyncio.wait({task}, timeout=settings.LEADER_CHECK_SECONDS)
+                    if not task.done():
+                        await asyncio.wait_for(conn.execute("SELECT 1"), timeout=settings.LEADER_CHECK_SECONDS)
+                # work() вернулась сама (например, не настроена) — лок держим, чтобы не запускать её снова
+                task.result()
+                logger.info(f"{name} finished, keeping leadership idle")
+                await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{name}: leadership lost or work failed: {e}")
+        finally:
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(settings.LEADER_RETRY_SECONDS)
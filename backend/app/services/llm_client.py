@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Mapping
+from dataclasses import dataclass, field
+from typing import Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DURATION_RE = re.compile(r"(?:(\d+)h)?(?:(\d+)m(?!s))?(?:([\d.]+)s)?(?:([\d.]+)ms)?$")
+
+
+class LlmError(RuntimeError):
+    """Provider error in a provider-neutral form, so the client can decide whether to retry."""
+
+    def __init__(self, message: str, retryable: bool = False, rate_limited: bool = False,
+                 retry_after: float | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+
+
+@dataclass
+class Completion:
+    text: str
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+
+class LlmProvider(Protocol):
+    """Backend behind LlmClient; implementations live in app.services.llm_providers."""
+
+    name: str
+
+    async def complete(self, *, messages: list[dict], model: str, temperature: float, max_tokens: int,
+                       json_mode: bool = False) -> Completion: ...
+
+    def stream(self, *, messages: list[dict], model: str, temperature: float,
+               max_tokens: int) -> AsyncIterator[str]: ...
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider has been failing; calls are rejected without a request until the cool-down passes."""
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Groq reset headers look like "2m59.56s", "7.66s" or "120ms"; retry-after is plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    m = _DURATION_RE.match(value.strip())
+    if not m or not any(m.groups()):
+        return None
+    h, mins, secs, ms = m.groups()
+    return int(h or 0) * 3600 + int(mins or 0) * 60 + float(secs or 0) + float(ms or 0) / 1000
+
+
+class TokenBucket:
+    """Client-side request rate limit, tightened by the provider's x-ratelimit-* headers."""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = max(1, rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(wait, (1 - self.tokens) / self.rate))
+
+    def update_from_headers(self, headers) -> None:
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is not None and remaining.isdigit():
+            self.tokens = min(self.tokens, float(remaining))
+        # Исчерпаны запросы или токены провайдера — не шлём ничего до сброса окна
+        for kind in ("requests", "tokens"):
+            left = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if left == "0" and reset:
+                self.block_for(reset)
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        if self.state == "open":
+            raise CircuitOpenError("LLM provider unavailable (circuit open)")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        # В half_open одна неудача снова размыкает цепь на полный таймаут
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            if self.opened_at is None:
+                logger.error(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+def _is_retryable(e: Exception) -> bool:
+    return isinstance(e, LlmError) and e.retryable
+
+
+def _is_provider_failure(e: Exception) -> bool:
+    # 429 — провайдер жив, просто нас притормаживает; цепь из-за этого не размыкаем
+    return _is_retryable(e) and not e.rate_limited
+
+
+class LlmClient:
+    """Shared entry point to the LLM provider: concurrency cap, rate limit, retries, circuit breaker, metrics."""
+
+    def __init__(self, provider: LlmProvider | None):
+        self.provider = provider
+        self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self.bucket = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+        self._latencies: deque[float] = deque(maxlen=500)
+        self._counters = {"requests": 0, "errors": 0, "retries": 0, "rejected": 0}
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def available(self) -> bool:
+        return self.provider is not None
+
+    async def _slot(self):
+        self.breaker.check()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._in_flight += 1
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def _backoff(self, attempt: int, e: Exception) -> None:
+        retry_after = e.retry_after if isinstance(e, LlmError) else None
+        if retry_after:
+            self.bucket.block_for(retry_after)
+        delay = retry_after or settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt
+        # Полный джиттер, чтобы повторы от разных воркеров не приходили пачкой
+        await asyncio.sleep(random.uniform(0, delay) if not retry_after else delay)
+
+    async def chat(self, **kwargs) -> Completion:
+        """Provider completion with retries; raises CircuitOpenError or the last provider error."""
+        if self.provider is None:
+            raise RuntimeError("LLM provider not initialized")
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            try:
+                await self._slot()
+            except CircuitOpenError:
+                self._counters["rejected"] += 1
+                raise
+            started = time.monotonic()
+            try:
+                response = await self.provider.complete(**kwargs)
+                self.bucket.update_from_headers(response.headers)
+            except Exception as e:
+                self._counters["errors"] += 1
+                if _is_provider_failure(e):
+                    self.breaker.record_failure()
+                if not _is_retryable(e) or attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                self._counters["retries"] += 1
+                logger.warning(f"LLM request failed ({e}), retry {attempt + 1}/{settings.LLM_MAX_RETRIES}")
+                error = e
+            else:
+                self.breaker.record_success()
+                return response
+            finally:
+                self._counters["requests"] += 1
+                self._latencies.append(time.monotonic() - started)
+                self._release()
+            await self._backoff(attempt, error)
+
+    async def stream(self, **kwargs) -> AsyncIterator[str]:
+        """Streaming completion; retried only until the first chunk arrives."""
+        if self.provider is None:
+            raise RuntimeError("LLM provider not initialized")
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            try:
+                await self._slot()
+            except CircuitOpenError:
+                self._counters["rejected"] += 1
+                raise
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for delta in self.provider.stream(**kwargs):
+                    yielded = True
+                    yield delta
+            except Exception as e:
+                self._counters["errors"] += 1
+                if _is_provider_failure(e):
+                    self.breaker.record_failure()
+                if yielded or not _is_retryable(e) or attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                self._counters["retries"] += 1
+                error = e
+            else:
+                self.breaker.record_success()
+                return
+            finally:
+                self._counters["requests"] += 1
+                self._latencies.append(time.monotonic() - started)
+                self._release()
+            await self._backoff(attempt, error)
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p: float) -> float | None:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return {
+            "provider": self.provider.name if self.provider else None,
+            **self._counters,
+            "queue_depth": self._waiting,
+            "in_flight": self._in_flight,
+            "circuit": self.breaker.state,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+        }
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import random
+import re
+from collections.abc import AsyncIterator
+
+import groq
+
+from app.config import settings
+from app.services.llm_client import Completion, LlmError, LlmProvider, parse_duration
+
+logger = logging.getLogger(__name__)
+
+
+def _translate(e: groq.APIError) -> LlmError:
+    if isinstance(e, groq.RateLimitError):
+        return LlmError(str(e), retryable=True, rate_limited=True,
+                        retry_after=parse_duration(e.response.headers.get("retry-after")))
+    if isinstance(e, groq.APIConnectionError):  # включая APITimeoutError
+        return LlmError(str(e), retryable=True)
+    if isinstance(e, groq.APIStatusError):
+        return LlmError(str(e), retryable=e.status_code >= 500)
+    return LlmError(str(e))
+
+
+class GroqProvider:
+    name = "groq"
+
+    def __init__(self, api_key: str, timeout: float):
+        # Повторы делает LlmClient, встроенные повторы SDK отключены
+        self.client = groq.AsyncGroq(api_key=api_key, max_retries=0, timeout=timeout)
+
+    async def complete(self, *, messages: list[dict], model: str, temperature: float, max_tokens: int,
+                       json_mode: bool = False) -> Completion:
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        try:
+            raw = await self.client.chat.completions.with_raw_response.create(
+                messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, **extra
+            )
+        except groq.APIError as e:
+            raise _translate(e) from e
+        response = raw.parse()
+        return Completion(text=response.choices[0].message.content or "", headers=raw.headers)
+
+    async def stream(self, *, messages: list[dict], model: str, temperature: float,
+                     max_tokens: int) -> AsyncIterator[str]:
+        try:
+            stream = await self.client.chat.completions.create(
+                messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except groq.APIError as e:
+            raise _translate(e) from e
+
+
+_NEGATIVE_RE = re.compile(r"не работает|неисправ|ошибк|срочно|сломал|отказ|жалоб", re.IGNORECASE)
+_CATEGORY_RES = [
+    ("calibration", re.compile(r"калибр|поверк|градуир", re.IGNORECASE)),
+    ("documentation", re.compile(r"паспорт|документ|инструкц|сертификат|руководств", re.IGNORECASE)),
+    ("malfunction", re.compile(r"не работает|неисправ|ошибк|сломал|отказ|не выходит", re.IGNORECASE)),
+]
+
+
+class FakeProvider:
+    """Offline stand-in for load tests: no network, canned answers, configurable latency and failures.
+
+    Answers depend only on the input text, so runs are reproducible; latency and
+    failures are drawn from a seeded RNG.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float, latency_dist: str, latency_sigma: float,
+                 failure_rate: float, rate_limit_rate: float, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+
+    def _latency(self) -> float:
+        if self.latency_dist == "fixed":
+            ms = self.latency_ms
+        elif self.latency_dist == "uniform":
+            ms = self.rng.uniform(0, 2 * self.latency_ms)
+        elif self.latency_dist == "exponential":
+            ms = self.rng.expovariate(1 / self.latency_ms) if self.latency_ms else 0
+        else:
+            # lognormal с медианой latency_ms — длинный хвост, как у настоящего API
+            ms = self.latency_ms * self.rng.lognormvariate(0, self.latency_sigma)
+        return ms / 1000
+
+    async def _simulate(self) -> None:
+        await asyncio.sleep(self._latency())
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            raise LlmError("fake: rate limited", retryable=True, rate_limited=True, retry_after=1.0)
+        if roll < self.rate_limit_rate + self.failure_rate:
+            raise LlmError("fake: provider error", retryable=True)
+
+    @staticmethod
+    def _analysis(text: str) -> dict:
+        category = next((name for name, regex in _CATEGORY_RES if regex.search(text)), "other")
+        return {
+            "sentiment": "negative" if _NEGATIVE_RE.search(text) else "neutral",
+            "category": category,
+            "full_name": None,
+            "company": None,
+            "summary": text[:200],
+            "draft_response": "Здравствуйте! Ваше обращение получено, специалист свяжется с вами.",
+            "confidence": 0.5,
+        }
+
+    def _answer(self, messages: list[dict], json_mode: bool) -> str:
+        text = messages[-1]["content"]
+        if not json_mode:
+            return f"Тестовый ответ на сообщение длиной {len(text)} символов."
+        try:
+            batch = json.loads(text)
+        except ValueError:
+            batch = None
+        if isinstance(batch, list):
+            # Пакетный запрос ai_service.analyze_tickets_batch
+            results = [{"id": item["id"], **self._analysis(item["text"])} for item in batch]
+            return json.dumps({"results": results}, ensure_ascii=False)
+        return json.dumps(self._analysis(text), ensure_ascii=False)
+
+    async def complete(self, *, messages: list[dict], model: str, temperature: float, max_tokens: int,
+                       json_mode: bool = False) -> Completion:
+        await self._simulate()
+        return Completion(text=self._answer(messages, json_mode))
+
+    async def stream(self, *, messages: list[dict], model: str, temperature: float,
+                     max_tokens: int) -> AsyncIterator[str]:
+        await self._simulate()
+        for i, word in enumerate(self._answer(messages, json_mode=False).split(" ")):
+            await asyncio.sleep(0)
+            yield word if i == 0 else " " + word
+
+
+def create_provider() -> LlmProvider | None:
+    """Provider selected by LLM_PROVIDER; None if it cannot be initialized."""
+    if settings.LLM_PROVIDER == "fake":
+        return FakeProvider(
+            latency_ms=settings.LLM_FAKE_LATENCY_MS,
+            latency_dist=settings.LLM_FAKE_LATENCY_DIST,
+            latency_sigma=settings.LLM_FAKE_LATENCY_SIGMA,
+            failure_rate=settings.LLM_FAKE_FAILURE_RATE,
+            rate_limit_rate=settings.LLM_FAKE_RATE_LIMIT_RATE,
+            seed=settings.LLM_FAKE_SEED,
+        )
+    try:
+        return GroqProvider(api_key=settings.GROQ_API_KEY, timeout=settings.LLM_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Failed to initialize Groq client: {e}")
+        return None
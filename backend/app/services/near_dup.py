@@ -0,0 +1,52 @@
+import hashlib
+import random
+import zlib
+
+from app.services.ai_cache import normalize_text
+
+# Сигнатуры хранятся в tickets.minhash / tickets.lsh_bands: любое изменение
+# параметров ниже делает старые сигнатуры несравнимыми с новыми
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# При BANDS=16, ROWS=4 пара с похожестью 0.8 становится кандидатом с вероятностью ~0.9998, с 0.3 — ~0.12
+# Хвост длиннее этого в сигнатуру не входит: 64 перестановки по каждому шинглу — чистый Python,
+# а у письма без лимита на размер это секунды CPU. Для повтора/пересылки хватает начала текста
+MAX_CHARS = 20_000
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20261017)
+_COEFFS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _shingles(text: str) -> set[int]:
+    words = normalize_text(text[:MAX_CHARS]).split()
+    if len(words) < SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode())
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(text: str) -> list[int] | None:
+    """MinHash signature of word 3-gram shingles of the first MAX_CHARS; None for empty text. CPU-bound."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    return [min((a * x + b) % _PRIME for x in shingles) for a, b in _COEFFS]
+
+
+def lsh_bands(signature: list[int]) -> list[int]:
+    """One 64-bit key per band; tickets sharing any key are near-duplicate candidates."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        raw = band.to_bytes(2, "big") + b"".join(v.to_bytes(4, "big") for v in rows)
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
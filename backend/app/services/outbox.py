@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, or_, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat_message import ChatMessage
+from app.models.outbox import OutboxMessage
+from app.services.email_service import send_email_response, CHAT_REPLY_SUBJECT
+
+logger = logging.getLogger(__name__)
+
+
+def queue_chat_message_email(session: AsyncSession, message: ChatMessage, to_email: str) -> OutboxMessage:
+    """Add the outbox row to the caller's session, so it commits together with the chat message.
+
+    `message` must already be flushed (have an id).
+    """
+    outbox = OutboxMessage(
+        idempotency_key=f"chat-{message.id}",
+        ticket_id=message.ticket_id,
+        chat_message_id=message.id,
+        to_email=to_email,
+        subject=CHAT_REPLY_SUBJECT,
+        body=message.text,
+    )
+    message.outbox = outbox
+    session.add(outbox)
+    return outbox
+
+
+async def _claim_batch() -> list[OutboxMessage]:
+    stale_before = func.now() - timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(OutboxMessage)
+            .where(or_(
+                and_(OutboxMessage.status == "pending", OutboxMessage.run_after <= func.now()),
+                # Диспетчер упал посреди отправки
+                and_(OutboxMessage.status == "sending", OutboxMessage.locked_at < stale_before),
+            ))
+            .order_by(OutboxMessage.id)
+            .limit(settings.OUTBOX_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        batch = list(result.scalars().all())
+        for item in batch:
+            item.status = "sending"
+            item.locked_at = func.now()
+            item.attempts += 1
+        await session.commit()
+    return batch
+
+
+async def _send(item: OutboxMessage) -> Exception | None:
+    try:
+        await send_email_response(
+            item.to_email, item.subject, item.body, item.ticket_id,
+            message_id_key=item.idempotency_key,
+        )
+    except Exception as e:
+        return e
+    return None
+
+
+async def _dispatch_batch(batch: list[OutboxMessage]) -> None:
+    errors = await asyncio.gather(*(_send(item) for item in batch))
+
+    async with AsyncSessionLocal() as session:
+        for item, error in zip(batch, errors):
+            row = await session.get(OutboxMessage, item.id)
+            row.locked_at = None
+            if error is None:
+                row.status = "sent"
+                row.sent_at = func.now()
+                row.last_error = None
+            elif isinstance(error, RuntimeError) or row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                # RuntimeError — SMTP не настроен, повторять бессмысленно
+                row.status = "failed"
+                row.last_error = str(error)[:2000]
+                logger.error(f"Outbox #{row.id} (ticket #{row.ticket_id}) failed after {row.attempts} attempts: {error}")
+            else:
+                delay = settings.OUTBOX_BACKOFF_SECONDS * 2 ** (row.attempts - 1)
+                row.status = "pending"
+                row.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                row.last_error = str(error)[:2000]
+                logger.warning(f"Outbox #{row.id} (ticket #{row.ticket_id}) send failed, retry in {delay:.0f}s: {error}")
+        await session.commit()
+
+
+async def run_outbox_dispatcher() -> None:
+    """Drain the outbox table in batches until cancelled."""
+    logger.info("Outbox dispatcher started")
+    while True:
+        try:
+            batch = await _claim_batch()
+            if batch:
+                await _dispatch_batch(batch)
+                continue
+        except Exception as e:
+            logger.error(f"Outbox dispatcher iteration error: {e}")
+        await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+
+import asyncpg
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from app.config import settings
+from app.database import AsyncSessionLocal, asyncpg_dsn
+from app.models.chat_message import ChatMessage
+from app.models.ticket import Ticket
+from app.schemas.chat import ChatMessageOut
+from app.schemas.ticket import TicketListItem
+from app.services.auth_service import invalidate_principal
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "realtime_events"   # см. триггеры notify_realtime_event (миграция 0015)
+RESYNC = {"type": "resync", "data": {}}
+
+# Строка списка — те же колонки, что отдаёт list_tickets, без original_email / ai_response
+_TICKET_COLUMNS = tuple(getattr(Ticket, name) for name in TicketListItem.model_fields)
+
+
+class EventHub:
+    """Fan-out of events to SSE subscribers of this process.
+
+    Every subscriber has a bounded queue. A client that falls behind is not allowed
+    to grow memory: its queue is dropped and replaced by a single `resync` event,
+    after which the client re-fetches the list instead of applying deltas.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: dict) -> None:
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+
+hub = EventHub()
+
+
+async def _load_events(notifications: list[dict]) -> list[dict]:
+    """One SELECT per event type for the whole batch of notifications."""
+    ticket_ids = {n["id"] for n in notifications if n.get("type") == "ticket"}
+    chat_ids = {n["id"] for n in notifications if n.get("type") == "chat"}
+    events = []
+    async with AsyncSessionLocal() as session:
+        if ticket_ids:
+            result = await session.execute(
+                select(Ticket).options(load_only(*_TICKET_COLUMNS)).where(Ticket.id.in_(ticket_ids))
+            )
+            events.extend(
+                {"type": "ticket", "data": TicketListItem.model_validate(t).model_dump(mode="json")}
+                for t in result.scalars()
+            )
+        if chat_ids:
+            result = await session.execute(
+                select(ChatMessage).where(ChatMessage.id.in_(chat_ids)).order_by(ChatMessage.id)
+            )
+            events.extend(
+                {"type": "chat", "data": ChatMessageOut.model_validate(m).model_dump(mode="json")}
+                for m in result.scalars()
+            )
+    return events
+
+
+async def _drain(pending: asyncio.Queue) -> list[dict]:
+    first = await asyncio.wait_for(pending.get(), timeout=settings.EVENTS_HEARTBEAT)
+    batch = [first]
+    while len(batch) < settings.EVENTS_BATCH_SIZE and not pending.empty():
+        batch.append(pending.get_nowait())
+    return batch
+
+
+async def run_event_listener() -> None:
+    """Background task: LISTEN on CHANNEL and publish full rows to the hub.
+
+    Rows are read once per process regardless of the number of connected clients.
+    After a reconnect notifications in between are lost, so clients get `resync`.
+    `user` notifications are not pushed: they only drop cached principals of this process.
+    """
+    delay = 1
+    reconnect = False
+    while True:
+        conn = None
+        try:
+            # LISTEN держит отдельное соединение вне пула SQLAlchemy
+            conn = await asyncpg.connect(asyncpg_dsn())
+            pending: asyncio.Queue = asyncio.Queue()
+
+            def on_notify(_conn, _pid, _channel, payload: str) -> None:
+                try:
+                    pending.put_nowait(json.loads(payload))
+                except ValueError:
+                    logger.warning(f"Bad realtime payload: {payload!r}")
+
+            await conn.add_listener(CHANNEL, on_notify)
+            logger.info(f"Listening on {CHANNEL}")
+            if reconnect:
+                hub.publish(RESYNC)
+            delay = 1
+
+            while not conn.is_closed():
+                try:
+                    batch = await _drain(pending)
+                except TimeoutError:
+                    # Тишина: проверяем, что соединение живо, иначе ждали бы NOTIFY вечно
+                    await conn.execute("SELECT 1")
+                    continue
+                for n in batch:
+                    if n.get("type") == "user":
+                        invalidate_principal(n["id"])
+                if not hub.subscribers:
+                    continue
+                for event in await _load_events(batch):
+                    hub.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Realtime listener error: {e}, reconnect in {delay} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+        finally:
+            reconnect = True
+            if conn is not None and not conn.is_closed():
+                await conn.close()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from email.message import Message
+
+import aiosmtplib
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SmtpPool:
+    """Persistent authenticated SMTP connections shared by all senders.
+
+    Idle connections are kept alive with NOOP and closed after SMTP_IDLE_TIMEOUT;
+    a connection that fails during send is dropped and the send retried on a fresh one.
+    """
+
+    def __init__(self, size: int | None = None):
+        self.size = size or settings.SMTP_POOL_SIZE
+        self._idle: list[_PooledConnection] = []
+        self._slots = asyncio.Semaphore(self.size)
+        self._keepalive_task: asyncio.Task | None = None
+
+    async def _connect(self) -> _PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.EMAIL_USER,
+            password=settings.EMAIL_PASSWORD,
+            start_tls=True,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+        await smtp.connect()
+        logger.info(f"SMTP connection opened to {settings.SMTP_HOST}")
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    async def _close(conn: _PooledConnection) -> None:
+        try:
+            await asyncio.wait_for(conn.smtp.quit(), timeout=5)
+        except Exception:
+            conn.smtp.close()
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            if conn.smtp.is_connected:
+                return conn
+        return await self._connect()
+
+    def _release(self, conn: _PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    async def send(self, message: Message) -> None:
+        async with self._slots:
+            conn = await self._acquire()
+            try:
+                await conn.smtp.send_message(message)
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError) as e:
+                # Сервер закрыл соединение, пока оно лежало в пуле — одна попытка на свежем
+                logger.warning(f"SMTP connection lost ({e}), reconnecting")
+                conn.smtp.close()
+                conn = await self._connect()
+                try:
+                    await conn.smtp.send_message(message)
+                except Exception:
+                    await self._close(conn)
+                    raise
+            except Exception:
+                await self._close(conn)
+                raise
+            self._release(conn)
+
+    async def _keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SMTP_KEEPALIVE_INTERVAL)
+            for conn in list(self._idle):
+                # Соединение на проверке занимает слот, как при отправке: иначе отправители,
+                # не найдя его в пуле, открыли бы сверх SMTP_POOL_SIZE
+                async with self._slots:
+                    if conn not in self._idle:
+                        continue   # пока ждали слот, его забрал отправитель
+                    self._idle.remove(conn)
+                    if time.monotonic() - conn.last_used > settings.SMTP_IDLE_TIMEOUT:
+                        await self._close(conn)
+                        continue
+                    try:
+                        await conn.smtp.noop()
+                    except Exception:
+                        conn.smtp.close()
+                        continue
+                    # last_used не трогаем: NOOP не продлевает жизнь простаивающему соединению
+                    self._idle.append(conn)
+
+    def start(self) -> None:
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def close(self) -> None:
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._close(conn)
+
+
+smtp_pool = SmtpPool()
@@ -0,0 +1,118 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import xlsxwriter
+from sqlalchemy import Select
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.ticket import Ticket
+
+# Те же колонки и подписи, что были у выгрузки во фронтенде (ExportButton)
+HEADERS = [
+    "ID", "Дата", "ФИО", "Объект / предприятие", "Телефон", "Email",
+    "Зав. номера приборов", "Тип приборов", "Тональность", "Категория", "Суть вопроса", "Статус",
+]
+EXPORT_COLUMNS = (
+    Ticket.id, Ticket.date_received, Ticket.full_name, Ticket.company, Ticket.phone, Ticket.email,
+    Ticket.device_serials, Ticket.device_type, Ticket.sentiment, Ticket.category, Ticket.summary, Ticket.status,
+)
+
+SENTIMENT_RU = {"positive": "Позитивная", "neutral": "Нейтральная", "negative": "Негативная"}
+CATEGORY_RU = {"malfunction": "Неисправность", "calibration": "Калибровка", "documentation": "Документация",
+               "other": "Прочее"}
+STATUS_RU = {"open": "Новая", "in_progress": "В работе", "needs_operator": "Нужен оператор", "closed": "Закрыта"}
+
+_FETCH_ROWS = 1000
+_FILE_CHUNK = 64 * 1024
+
+
+def _row(r) -> list:
+    (ticket_id, date_received, full_name, company, phone, email,
+     serials, device_type, sentiment, category, summary, status) = r
+    return [
+        ticket_id,
+        date_received.astimezone(ZoneInfo(settings.EXPORT_TIMEZONE)).strftime("%d.%m.%Y, %H:%M:%S"),
+        full_name or "",
+        company or "",
+        phone or "",
+        email or "",
+        "; ".join(serials or []),
+        device_type or "",
+        SENTIMENT_RU.get(sentiment, sentiment or ""),
+        CATEGORY_RU.get(category, category or ""),
+        summary or "",
+        STATUS_RU.get(status, status or ""),
+    ]
+
+
+async def _rows(query: Select) -> AsyncIterator[list[list]]:
+    """Batches of formatted rows from a server-side cursor; at most _FETCH_ROWS rows in memory."""
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            query.with_only_columns(*EXPORT_COLUMNS).execution_options(yield_per=_FETCH_ROWS)
+        )
+        async for partition in result.partitions():
+            yield [_row(r) for r in partition]
+
+
+async def stream_csv(query: Select) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    # BOM — чтобы Excel открыл UTF-8 без мастера импорта
+    buffer.write("\ufeff")
+    writer.writerow(HEADERS)
+    async for batch in _rows(query):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _open_workbook(path: str):
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": os.path.dirname(path)})
+    sheet = workbook.add_worksheet("Заявки")
+    sheet.write_row(0, 0, HEADERS)
+    return workbook, sheet
+
+
+def _write_rows(sheet, first_row: int, rows: list[list]) -> None:
+    for i, row in enumerate(rows):
+        sheet.write_row(first_row + i, 0, row)
+
+
+async def stream_xlsx(query: Select) -> AsyncIterator[bytes]:
+    """XLSX in xlsxwriter constant_memory mode: rows are flushed to disk as written.
+
+    The zip container can only be assembled once all rows are in, so the file is
+    built in a temporary file first and then streamed from disk.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        # В constant_memory каждая строка пишется во временный файл — вся запись идёт в потоке,
+        # по одному переходу на пачку из _FETCH_ROWS строк
+        workbook, sheet = await asyncio.to_thread(_open_workbook, path)
+        row_idx = 1
+        async for batch in _rows(query):
+            await asyncio.to_thread(_write_rows, sheet, row_idx, batch)
+            row_idx += len(batch)
+        await asyncio.to_thread(workbook.close)
+
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, _FILE_CHUNK):
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def export_filename(fmt: str) -> str:
+    return f"tickets_{datetime.now(ZoneInfo(settings.EXPORT_TIMEZONE)):%Y-%m-%d}.{fmt}"
@@ -0,0 +1,13 @@
+# Оценка без токенизатора: для смеси русского и английского у Llama 3 выходит ~3 символа на токен
+CHARS_PER_TOKEN = 3
+# Служебные токены роли и разделителей на каждое сообщение
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit] + "…"
@@ -0,0 +1,68 @@
+"""Background worker: email ingestion, AI analysis queue, client email outbox, KB indexing.
+
+Run any number of copies next to the API:
+
+    cd backend && python -m app.worker
+
+The IMAP poller and the KB indexer run in one elected leader at a time
+(Postgres advisory lock); AI workers and the outbox dispatcher claim rows with
+SKIP LOCKED and run in every copy.
+"""
+import asyncio
+import logging
+import signal
+
+from app.services.ai_jobs import start_ai_workers
+from app.services.email_service import start_email_polling
+from app.services.kb_index import run_kb_indexer
+from app.services.leader import run_as_leader
+from app.services.outbox import run_outbox_dispatcher
+from app.services.smtp_pool import smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+def background_tasks() -> list[asyncio.Task]:
+    """Start the worker tasks on the running loop; also used by the API when API_RUN_WORKERS is set."""
+    return [
+        asyncio.create_task(run_as_leader("email_poller", lambda: start_email_polling(interval=60))),
+        asyncio.create_task(run_as_leader("kb_indexer", run_kb_indexer)),
+        asyncio.create_task(start_ai_workers()),
+        asyncio.create_task(run_outbox_dispatcher()),
+    ]
+
+
+async def stop_tasks(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def run_worker() -> None:
+    smtp_pool.start()
+    tasks = background_tasks()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Worker started")
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Worker stopping")
+        await stop_tasks(tasks)
+        await smtp_pool.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Drain time of a synthetic email burst through the real ingestion pipeline.
+
+process_messages, ticket ingestion, reply handling, the AI job queue and the
+outbox dispatcher run unchanged against Postgres. Only the outside world is
+stubbed: the LLM provider is FakeProvider (--ai-ms) and SMTP sends are sleeps
+(--smtp-ms). Point DATABASE_URL at a scratch database with migrations applied:
+the AI workers and the dispatcher also pick up any other pending rows they find.
+
+After each run the script checks that client replies landed in every ticket's
+chat in arrival order, then deletes the tickets it created.
+
+    cd backend && python -m scripts.bench_email_drain --emails 50 --concurrency 1 8 16
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert, select
+
+from app.database import AsyncSessionLocal
+from app.models.ai_job import AiJob
+from app.models.chat_message import ChatMessage
+from app.models.outbox import OutboxMessage
+from app.models.ticket import Ticket
+from app.services import ai_service, email_service
+from app.services.ai_jobs import start_ai_workers
+from app.services.llm_client import LlmClient
+from app.services.llm_providers import FakeProvider
+from app.services.outbox import run_outbox_dispatcher
+from app.services.smtp_pool import smtp_pool
+
+settings = email_service.settings
+
+
+def _install_stubs(ai_ms: float, smtp_ms: float) -> None:
+    ai_service.llm = LlmClient(FakeProvider(
+        latency_ms=ai_ms, latency_dist="lognormal", latency_sigma=0.5,
+        failure_rate=0.0, rate_limit_rate=0.0, seed=42,
+    ))
+
+    async def send(message) -> None:
+        await asyncio.sleep(smtp_ms / 1000)
+
+    # send_email_response проверяет настройки SMTP до отправки
+    settings.SMTP_HOST, settings.EMAIL_USER, settings.EMAIL_PASSWORD = "bench.invalid", "bench", "bench"
+    smtp_pool.send = send
+
+
+async def _seed_tickets(n: int, tag: str) -> list[int]:
+    """Existing tickets that the burst replies to."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True),
+            [
+                {"date_received": datetime.now(timezone.utc), "email": f"seed{i}@example.com",
+                 "original_email": f"{tag} seed {i}", "status": "open"}
+                for i in range(n)
+            ],
+        )
+        ids = list(result.scalars())
+        await session.commit()
+    return ids
+
+
+def _make_burst(n: int, reply_share: float, seed_ids: list[int], tag: str) -> list[dict]:
+    messages = []
+    for i in range(n):
+        reply_to = random.choice(seed_ids) if random.random() < reply_share else None
+        messages.append({
+            "subject": f"[#{reply_to}] Re: заявка" if reply_to else f"Неисправность #{i}",
+            "from": f"client{i}@example.com",
+            "email": f"client{i}@example.com",
+            # Тег и номер — чтобы найти свои строки и сверить порядок ответов
+            "body": f"{tag} #{i}: прибор ДГС ЭРИС-230 не выходит на режим",
+            "date": datetime.now(timezone.utc),
+            "reply_ticket_id": reply_to,
+        })
+    return messages
+
+
+async def _wait_drained(ticket_ids: list[int], poll: float = 0.05) -> None:
+    while True:
+        async with AsyncSessionLocal() as session:
+            jobs = (await session.execute(
+                select(AiJob.id).where(AiJob.ticket_id.in_(ticket_ids), AiJob.status.in_(["pending", "running"]))
+                .limit(1)
+            )).first()
+            mails = (await session.execute(
+                select(OutboxMessage.id)
+                .where(OutboxMessage.ticket_id.in_(ticket_ids), OutboxMessage.status.in_(["pending", "sending"]))
+                .limit(1)
+            )).first()
+        if jobs is None and mails is None:
+            return
+        await asyncio.sleep(poll)
+
+
+async def _replies_in_order(messages: list[dict], seed_ids: list[int]) -> bool:
+    expected: dict[int, list[str]] = {}
+    for m in messages:
+        if m["reply_ticket_id"]:
+            expected.setdefault(m["reply_ticket_id"], []).append(m["body"])
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(ChatMessage.ticket_id, ChatMessage.text)
+            .where(ChatMessage.ticket_id.in_(seed_ids), ChatMessage.role == "user")
+            .order_by(ChatMessage.id)
+        )
+        actual: dict[int, list[str]] = {}
+        for ticket_id, text in result:
+            actual.setdefault(ticket_id, []).append(text)
+    return all(actual.get(tid, []) == bodies for tid, bodies in expected.items())
+
+
+async def _run(n: int, reply_share: float, concurrency: int, ai_workers: int) -> None:
+    tag = f"bench-{uuid.uuid4().hex[:8]}"
+    seed_ids = await _seed_tickets(max(1, n // 10), tag)
+    messages = _make_burst(n, reply_share, seed_ids, tag)
+    workers = [asyncio.create_task(start_ai_workers(ai_workers)), asyncio.create_task(run_outbox_dispatcher())]
+    try:
+        started = time.perf_counter()
+        await email_service.process_messages(messages, concurrency=concurrency)
+        ingested = time.perf_counter() - started
+
+        async with AsyncSessionLocal() as session:
+            ticket_ids = list((await session.execute(
+                select(Ticket.id).where(Ticket.original_email.contains(tag))
+            )).scalars())
+        await _wait_drained(ticket_ids)
+        drained = time.perf_counter() - started
+
+        in_order = await _replies_in_order(messages, seed_ids)
+        print(f"concurrency={concurrency:>3}: ingested {ingested:6.2f} s, AI replies sent {drained:6.2f} s, "
+              f"per-ticket reply order kept: {in_order}")
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(Ticket).where(Ticket.original_email.contains(tag)))
+            await session.commit()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    # Один цикл событий на все прогоны: пул соединений SQLAlchemy привязан к нему
+    for concurrency in args.concurrency:
+        await _run(args.emails, args.reply_share, concurrency, args.ai_workers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--reply-share", type=float, default=0.3)
+    parser.add_argument("--ai-ms", type=float, default=1500, help="median latency of the fake LLM")
+    parser.add_argument("--smtp-ms", type=float, default=300)
+    parser.add_argument("--ai-workers", type=int, default=settings.AI_WORKERS)
+    parser.add_argument("--batch", type=int, default=settings.EMAIL_INGEST_BATCH)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    settings.EMAIL_INGEST_BATCH = args.batch
+    settings.AI_CACHE_ENABLED = False
+    settings.KB_RAG_ENABLED = False
+    settings.LLM_REQUESTS_PER_MINUTE = 100_000
+    settings.AI_JOB_POLL_INTERVAL = settings.OUTBOX_POLL_INTERVAL = 0.05
+    _install_stubs(args.ai_ms, args.smtp_ms)
+    random.seed(42)
+    print(f"{args.emails} emails, AI {args.ai_ms:.0f} ms, SMTP {args.smtp_ms:.0f} ms, {args.ai_workers} AI workers")
+
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
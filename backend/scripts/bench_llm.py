@@ -0,0 +1,99 @@
+"""End-to-end throughput of ticket analysis and chat replies against the fake LLM provider.
+
+Runs analyze_ticket_with_ai and generate_chat_reply through the real LlmClient
+(semaphore, rate limit, retries, circuit breaker), with the provider replaced
+by FakeProvider — no network, no tokens, reproducible with --seed. The
+analysis cache is disabled so every call reaches the provider.
+
+    cd backend && python -m scripts.bench_llm --tickets 200 --chats 50 --latency-ms 800 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from app.services import ai_service
+from app.services.llm_client import LlmClient
+from app.services.llm_providers import FakeProvider
+
+_TEXTS = [
+    "Газоанализатор ДГС ЭРИС-230 зав. № 230012345 не выходит на режим, горит ошибка.",
+    "Просим выслать паспорт и сертификат на ДГС ЭРИС-124.",
+    "Требуется калибровка двух датчиков, серийные номера 124000101 и 124000102.",
+    "Добрый день! Подскажите сроки поставки.",
+]
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def _timed(coro, latencies: list[float]):
+    started = time.perf_counter()
+    result = await coro
+    latencies.append(time.perf_counter() - started)
+    return result
+
+
+async def _run(tickets: int, chats: int) -> None:
+    analysis_lat: list[float] = []
+    chat_lat: list[float] = []
+    jobs = [
+        _timed(ai_service.analyze_ticket_with_ai(f"{_TEXTS[i % len(_TEXTS)]} #{i}"), analysis_lat)
+        for i in range(tickets)
+    ]
+    jobs += [
+        _timed(ai_service.generate_chat_reply(_TEXTS[i % len(_TEXTS)], [{"role": "user", "text": "Что делать?"}]),
+               chat_lat)
+        for i in range(chats)
+    ]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - started
+
+    fallbacks = sum(1 for r in results[:tickets] if r["confidence"] == 0.0)
+    chat_errors = sum(1 for r in results[tickets:] if r == ai_service.CHAT_ERROR_REPLY)
+    print(f"{tickets + chats} calls in {elapsed:.2f} s ({(tickets + chats) / elapsed:.1f}/s)")
+    for name, lat in (("analysis", analysis_lat), ("chat", chat_lat)):
+        if lat:
+            print(f"  {name:<8} p50 {_percentile(lat, 0.5):.2f} s  p95 {_percentile(lat, 0.95):.2f} s"
+                  f"  p99 {_percentile(lat, 0.99):.2f} s")
+    print(f"  analysis fallbacks: {fallbacks}, chat errors: {chat_errors}")
+    print(f"  llm: {ai_service.llm.metrics()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--latency-dist", default="lognormal", choices=["lognormal", "exponential", "uniform", "fixed"])
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=ai_service.settings.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=6000, help="client-side requests per minute")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    settings = ai_service.settings
+    settings.AI_CACHE_ENABLED = False
+    settings.KB_RAG_ENABLED = False   # без эмбеддингов и БД: меряется только клиент LLM
+    settings.LLM_MAX_CONCURRENCY = args.concurrency
+    settings.LLM_REQUESTS_PER_MINUTE = args.rpm
+    ai_service.llm = LlmClient(FakeProvider(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.sigma,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ))
+    print(f"fake provider: {args.latency_dist} {args.latency_ms:.0f} ms, failures {args.failure_rate:.0%}, "
+          f"429 {args.rate_limit_rate:.0%}, concurrency {args.concurrency}, {args.rpm} rpm")
+    asyncio.run(_run(args.tickets, args.chats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Latency of other requests on the same event loop during a login storm.
+
+A probe coroutine stands in for cheap API endpoints: every --probe-ms it
+measures how late the loop gets back to it. Meanwhile --logins password
+checks run with --concurrency at a time, either inline on the loop (the old
+verify_password in authenticate) or in the bounded bcrypt pool. No DB or HTTP
+is involved, so what is measured is exactly the event-loop stall.
+
+    cd backend && python -m scripts.bench_login --logins 40 --concurrency 8 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+
+from passlib.hash import bcrypt
+
+from app.services import auth_service
+
+_PASSWORD = "correct horse battery staple"
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def _probe(interval: float, latencies: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        # Задержка сверх запрошенного sleep — столько ждал бы любой другой запрос к этому воркеру
+        latencies.append(time.perf_counter() - started - interval)
+
+
+async def _login_inline(hashed: str) -> None:
+    assert auth_service.verify_password(_PASSWORD, hashed)
+
+
+async def _login_pooled(hashed: str) -> None:
+    valid, _ = await auth_service.verify_and_update_password(_PASSWORD, hashed)
+    assert valid
+
+
+async def _storm(mode: str, hashed: str, logins: int, concurrency: int, probe_ms: float) -> None:
+    login = _login_inline if mode == "inline" else _login_pooled
+    semaphore = asyncio.Semaphore(concurrency)
+    login_lat: list[float] = []
+    probe_lat: list[float] = []
+    stop = asyncio.Event()
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await login(hashed)
+            login_lat.append(time.perf_counter() - started)
+
+    probe = asyncio.create_task(_probe(probe_ms / 1000, probe_lat, stop))
+    await asyncio.sleep(probe_ms / 1000 * 5)   # базовая линия без логинов
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    print(f"{mode:<7} {logins} logins in {elapsed:.2f} s ({logins / elapsed:.1f}/s), "
+          f"login p50 {_percentile(login_lat, 0.5) * 1000:.0f} ms p99 {_percentile(login_lat, 0.99) * 1000:.0f} ms")
+    print(f"        other requests: p50 {_percentile(probe_lat, 0.5) * 1000:.1f} ms  "
+          f"p99 {_percentile(probe_lat, 0.99) * 1000:.1f} ms  max {max(probe_lat, default=0) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8, help="logins in flight at once")
+    parser.add_argument("--rounds", type=int, default=auth_service.settings.AUTH_BCRYPT_ROUNDS,
+                        help="cost of the test hash; below AUTH_BCRYPT_ROUNDS the pool mode also rehashes")
+    parser.add_argument("--probe-ms", type=float, default=5.0, help="interval of the latency probe")
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+
+    hashed = bcrypt.using(rounds=args.rounds).hash(_PASSWORD)
+    print(f"bcrypt rounds {args.rounds}, pool of {auth_service.settings.AUTH_HASH_WORKERS} threads")
+    for mode in (["inline", "pool"] if args.mode == "both" else [args.mode]):
+        asyncio.run(_storm(mode, hashed, args.logins, args.concurrency, args.probe_ms))
+
+
+if __name__ == "__main__":
+    main()
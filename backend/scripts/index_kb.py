@@ -0,0 +1,41 @@
+"""One-off (re)indexing of knowledge base files for retrieval.
+
+The worker (app.worker, the elected kb_indexer leader) does the same in the
+background every KB_INDEX_INTERVAL seconds; this is for the first load of a
+large KB or after changing KB_EMBEDDING_MODEL (--force).
+
+    cd backend && python -m scripts.index_kb
+    cd backend && python -m scripts.index_kb --force
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal
+from app.models.knowledge_base import KbFile
+from app.services.kb_index import index_kb_files
+
+
+async def _run(force: bool) -> dict:
+    if force:
+        # Без сохранённого хэша каждый файл считается изменённым
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(KbFile).values(content_hash=None))
+            await session.commit()
+    return await index_kb_files()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="re-index unchanged files too")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = asyncio.run(_run(args.force))
+    print(f"{stats} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Bulk re-run of AI analysis, e.g. after a prompt change or a historical mailbox import.
+
+Short tickets are packed several per LLM request and sent over parallel lanes;
+results are written back with one bulk UPDATE per chunk. The run is resumable:
+on failure it prints the --from-id to continue from.
+
+    cd backend && python -m scripts.reanalyze_tickets --from-id 0 --to-id 50000 --batch 8 --lanes 4
+    cd backend && python -m scripts.reanalyze_tickets --only-missing
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.config import settings
+from app.services.ai_backfill import reanalyze_range
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-id", type=int, default=0, help="start after this ticket id")
+    parser.add_argument("--to-id", type=int, default=None, help="last ticket id, inclusive")
+    parser.add_argument("--only-missing", action="store_true", help="only tickets without sentiment")
+    parser.add_argument("--batch", type=int, default=settings.AI_BATCH_SIZE, help="tickets per LLM request")
+    parser.add_argument("--lanes", type=int, default=settings.AI_BACKFILL_LANES, help="parallel LLM requests")
+    parser.add_argument("--chunk", type=int, default=settings.AI_BACKFILL_CHUNK, help="tickets per bulk UPDATE")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(stats: dict) -> None:
+        rate = stats["processed"] / max(time.perf_counter() - started, 1e-9)
+        print(f"up to #{stats['last_id']}: {stats['processed']} analyzed ({rate:.1f}/s)", flush=True)
+
+    stats = asyncio.run(reanalyze_range(
+        from_id=args.from_id,
+        to_id=args.to_id,
+        only_missing=args.only_missing,
+        batch_size=args.batch,
+        lanes=args.lanes,
+        chunk=args.chunk,
+        on_progress=progress,
+    ))
+    if stats["error"]:
+        print(f"stopped: {stats['error']}\nresume with --from-id {stats['last_id']}", file=sys.stderr)
+        sys.exit(1)
+    print(f"done: {stats['processed']} tickets in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
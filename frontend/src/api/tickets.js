@@ -5,12 +5,48 @@ function authHeaders() {
   return token ? { Authorization: `Bearer ${token}` } : {};
 }
 
-export async function fetchTickets() {
-  const res = await fetch(`${API_BASE}/api/tickets`, { headers: authHeaders() });
+// Фильтры списка (status, sentiment, category) — пустые значения не передаются
+function filterParams(filters = {}) {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(filters)) {
+    if (value) params.set(key, value);
+  }
+  return params;
+}
+
+export async function fetchTickets(cursor = null, filters = {}) {
+  const params = filterParams(filters);
+  if (cursor) params.set('cursor', cursor);
+  const query = params.toString() ? `?${params}` : '';
+  const res = await fetch(`${API_BASE}/api/tickets${query}`, { headers: authHeaders() });
   if (!res.ok) throw new Error('Server error');
   return await res.json();
 }
 
+// Только заявки, изменённые после updatedSince (sync_since из прошлого ответа списка)
+export async function fetchTicketChanges(updatedSince, cursor = null) {
+  const params = new URLSearchParams({ updated_since: updatedSince });
+  if (cursor) params.set('cursor', cursor);
+  const res = await fetch(`${API_BASE}/api/tickets?${params}`, { headers: authHeaders() });
+  if (!res.ok) throw new Error('Server error');
+  return await res.json();
+}
+
+export async function fetchTicketStats() {
+  const res = await fetch(`${API_BASE}/api/tickets/stats`, { headers: authHeaders() });
+  if (!res.ok) throw new Error('Server error');
+  return await res.json();
+}
+
+// Выгрузка с теми же фильтрами, что у списка
+export async function exportTickets(format, filters = {}) {
+  const params = filterParams(filters);
+  params.set('format', format);
+  const res = await fetch(`${API_BASE}/api/tickets/export?${params}`, { headers: authHeaders() });
+  if (!res.ok) throw new Error('Server error');
+  return await res.blob();
+}
+
 export async function fetchTicket(id) {
   const res = await fetch(`${API_BASE}/api/tickets/${id}`, { headers: authHeaders() });
   if (!res.ok) throw new Error('Server error');
@@ -71,6 +107,88 @@ export async function getAiChatReply(ticketId) {
   return await res.json();
 }
 
+// SSE поверх fetch: EventSource не умеет POST и заголовок Authorization
+export async function streamAiChatReply(ticketId, onDelta) {
+  const res = await fetch(`${API_BASE}/api/tickets/${ticketId}/chat/reply/stream`, {
+    method: 'POST',
+    headers: authHeaders(),
+  });
+  if (!res.ok || !res.body) throw new Error('Server error');
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  let saved = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = raw.match(/^data: (.*)$/m)?.[1];
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'delta') onDelta(payload.text);
+      if (event === 'done') saved = payload;
+      // Ответ оборвался на стороне модели: ничего не сохранено, частичный текст отбрасываем
+      if (event === 'error') throw new Error(payload.detail);
+    }
+  }
+  return saved;
+}
+
+// Push-события заявок и чата (SSE поверх fetch — нужен заголовок Authorization).
+// Переподключается сам; после обрыва шлёт onEvent('resync') — события за это время потеряны.
+// Возвращает функцию отписки.
+export function subscribeEvents(onEvent) {
+  const controller = new AbortController();
+  let delay = 1000;
+  let connectedOnce = false;
+
+  async function connect() {
+    const res = await fetch(`${API_BASE}/api/tickets/events`, {
+      headers: authHeaders(),
+      signal: controller.signal,
+    });
+    if (!res.ok || !res.body) throw new Error('Server error');
+    if (connectedOnce) onEvent('resync', {});
+    connectedOnce = true;
+    delay = 1000;
+
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = raw.match(/^data: (.*)$/m)?.[1];
+        if (!event || !data) continue;
+        onEvent(event, JSON.parse(data));
+      }
+    }
+  }
+
+  (async () => {
+    while (!controller.signal.aborted) {
+      try {
+        await connect();
+      } catch {
+        // сеть / рестарт сервера — пробуем снова с backoff
+      }
+      if (controller.signal.aborted) break;
+      await new Promise((resolve) => setTimeout(resolve, delay));
+      delay = Math.min(delay * 2, 30000);
+    }
+  })();
+
+  return () => controller.abort();
+}
+
 export async function fetchMe() {
   const res = await fetch(`${API_BASE}/api/auth/me`, { headers: authHeaders() });
   if (!res.ok) throw new Error('Server error');
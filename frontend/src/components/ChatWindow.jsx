@@ -1,13 +1,21 @@
 import { useState, useEffect, useRef } from 'react';
-import { fetchChat, postChatMessage } from '../api/tickets';
+import { fetchChat, postChatMessage, streamAiChatReply } from '../api/tickets';
 import './ChatWindow.css';
 
 const ROLE_AVATAR = { user: '👤', bot: '🤖', operator: '👨‍💼' };
 
-export default function ChatWindow({ ticket, onTicketUpdate }) {
+// Сообщение может прийти и ответом на POST, и push-событием — не дублируем
+function upsertMessage(list, msg) {
+  const idx = list.findIndex((m) => m.id === msg.id);
+  if (idx === -1) return [...list, msg];
+  return list.map((m, i) => (i === idx ? msg : m));
+}
+
+export default function ChatWindow({ ticket, onTicketUpdate, chatEvent }) {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [sending, setSending] = useState(false);
+  const [streaming, setStreaming] = useState(null);
   const bottomRef = useRef(null);
 
   const canRespond = ticket?.status === 'needs_operator';
@@ -30,9 +38,18 @@ export default function ChatWindow({ ticket, onTicketUpdate }) {
     }
   }, [ticket?.status]);
 
+  useEffect(() => {
+    if (!chatEvent || !ticket) return;
+    if (chatEvent.resync) {
+      fetchChat(ticket.id).then(setMessages).catch(() => {});
+    } else if (chatEvent.message.ticket_id === ticket.id) {
+      setMessages((prev) => upsertMessage(prev, chatEvent.message));
+    }
+  }, [chatEvent]);
+
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
+  }, [messages, streaming]);
 
   async function handleSend() {
     const text = input.trim();
@@ -43,7 +60,7 @@ export default function ChatWindow({ ticket, onTicketUpdate }) {
     try {
       // Save as operator message — backend will email client
       const saved = await postChatMessage(ticket.id, 'operator', text);
-      setMessages((prev) => [...prev, saved]);
+      setMessages((prev) => upsertMessage(prev, saved));
     } catch {
       // ignore
     } finally {
@@ -51,6 +68,21 @@ export default function ChatWindow({ ticket, onTicketUpdate }) {
     }
   }
 
+  async function handleAiReply() {
+    if (sending || streaming !== null) return;
+    setStreaming('');
+    try {
+      const saved = await streamAiChatReply(ticket.id, (delta) => {
+        setStreaming((prev) => (prev ?? '') + delta);
+      });
+      if (saved) setMessages((prev) => upsertMessage(prev, saved));
+    } catch {
+      // ignore
+    } finally {
+      setStreaming(null);
+    }
+  }
+
   function handleKey(e) {
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault();
@@ -88,6 +120,12 @@ export default function ChatWindow({ ticket, onTicketUpdate }) {
             </div>
           );
         })}
+        {streaming !== null && (
+          <div className="chat-bubble chat-bubble--bot chat-bubble--streaming">
+            <div className="chat-text">{streaming || '...'}</div>
+            <span className="chat-avatar">{ROLE_AVATAR.bot}</span>
+          </div>
+        )}
         <div ref={bottomRef} />
       </div>
 
@@ -102,6 +140,14 @@ export default function ChatWindow({ ticket, onTicketUpdate }) {
             rows={1}
             disabled={sending}
           />
+          <button
+            className="chat-send-btn chat-ai-btn"
+            onClick={handleAiReply}
+            disabled={sending || streaming !== null}
+            title="Ответ AI-ассистента"
+          >
+            🤖
+          </button>
           <button
             className="chat-send-btn"
             onClick={handleSend}
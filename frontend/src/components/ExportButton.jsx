@@ -1,48 +1,7 @@
-import * as XLSX from 'xlsx';
+import { useState } from 'react';
+import { exportTickets } from '../api/tickets';
 import './ExportButton.css';
 
-const SENTIMENT_RU = { positive: 'Позитивная', neutral: 'Нейтральная', negative: 'Негативная' };
-const CATEGORY_RU = { malfunction: 'Неисправность', calibration: 'Калибровка', documentation: 'Документация', other: 'Прочее' };
-const STATUS_RU = { open: 'Новая', in_progress: 'В работе', needs_operator: 'Нужен оператор', closed: 'Закрыта' };
-
-const HEADERS = [
-  'ID', 'Дата', 'ФИО', 'Объект / предприятие', 'Телефон', 'Email',
-  'Зав. номера приборов', 'Тип приборов', 'Тональность', 'Категория', 'Суть вопроса', 'Статус',
-];
-
-function toRows(tickets) {
-  return tickets.map((t) => [
-    t.id,
-    new Date(t.date_received).toLocaleString('ru-RU'),
-    t.full_name ?? '',
-    t.company ?? '',
-    t.phone ?? '',
-    t.email ?? '',
-    (t.device_serials || []).join('; '),
-    t.device_type ?? '',
-    SENTIMENT_RU[t.sentiment] ?? t.sentiment ?? '',
-    CATEGORY_RU[t.category] ?? t.category ?? '',
-    t.summary ?? '',
-    STATUS_RU[t.status] ?? t.status ?? '',
-  ]);
-}
-
-function exportCSV(tickets) {
-  const rows = [HEADERS, ...toRows(tickets)];
-  const csv = rows
-    .map((row) => row.map((cell) => `"${String(cell).replace(/"/g, '""')}"`).join(','))
-    .join('\n');
-  const blob = new Blob(['\uFEFF' + csv], { type: 'text/csv;charset=utf-8;' });
-  download(blob, `tickets_${today()}.csv`);
-}
-
-function exportXLSX(tickets) {
-  const ws = XLSX.utils.aoa_to_sheet([HEADERS, ...toRows(tickets)]);
-  const wb = XLSX.utils.book_new();
-  XLSX.utils.book_append_sheet(wb, ws, 'Заявки');
-  XLSX.writeFile(wb, `tickets_${today()}.xlsx`);
-}
-
 function today() {
   return new Date().toISOString().slice(0, 10);
 }
@@ -56,14 +15,28 @@ function download(blob, name) {
   URL.revokeObjectURL(url);
 }
 
-export default function ExportButton({ tickets }) {
+// Файл собирает сервер по всем заявкам под фильтрами списка, а не по загруженным страницам
+export default function ExportButton({ filters }) {
+  const [busy, setBusy] = useState(null);
+
+  async function handleExport(format) {
+    setBusy(format);
+    try {
+      download(await exportTickets(format, filters), `tickets_${today()}.${format}`);
+    } catch {
+      window.alert('Не удалось выгрузить заявки, попробуйте позже');
+    } finally {
+      setBusy(null);
+    }
+  }
+
   return (
     <div className="export-group">
-      <button className="export-btn export-btn--csv" onClick={() => exportCSV(tickets)}>
-        CSV
+      <button className="export-btn export-btn--csv" disabled={busy !== null} onClick={() => handleExport('csv')}>
+        {busy === 'csv' ? '…' : 'CSV'}
       </button>
-      <button className="export-btn export-btn--xlsx" onClick={() => exportXLSX(tickets)}>
-        XLSX
+      <button className="export-btn export-btn--xlsx" disabled={busy !== null} onClick={() => handleExport('xlsx')}>
+        {busy === 'xlsx' ? '…' : 'XLSX'}
       </button>
     </div>
   );
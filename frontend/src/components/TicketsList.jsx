@@ -12,7 +12,7 @@ function fmt(dateStr) {
   });
 }
 
-export default function TicketsList({ tickets, selectedId, onSelect }) {
+export default function TicketsList({ tickets, selectedId, onSelect, onLoadMore }) {
   return (
     <aside className="tickets-list">
       <div className="tickets-list-header">
@@ -31,6 +31,11 @@ export default function TicketsList({ tickets, selectedId, onSelect }) {
               <div className="ticket-card-main">
                 <div className="ticket-card-meta">
                   <span className="ticket-card-date">{fmt(ticket.date_received)}</span>
+                  {ticket.duplicate_of && (
+                    <span className="ticket-card-duplicate" title="Почти-дубликат, анализ взят из исходной заявки">
+                      дубль #{ticket.duplicate_of}
+                    </span>
+                  )}
                   <span className="ticket-card-status" title={status.label}>{status.icon}</span>
                 </div>
                 <div className="ticket-card-name">{ticket.full_name}</div>
@@ -39,6 +44,11 @@ export default function TicketsList({ tickets, selectedId, onSelect }) {
             </div>
           );
         })}
+        {onLoadMore && (
+          <button className="tickets-list-more" onClick={onLoadMore}>
+            Загрузить ещё
+          </button>
+        )}
       </div>
     </aside>
   );
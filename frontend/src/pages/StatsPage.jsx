@@ -1,3 +1,5 @@
+import { useEffect, useState } from 'react';
+import { fetchTicketStats } from '../api/tickets';
 import './StatsPage.css';
 
 const STATUS_LABEL = { open: 'Открыто', in_progress: 'В работе', closed: 'Закрыто' };
@@ -7,14 +9,6 @@ const CATEGORY_COLOR = { malfunction: '#ef4444', calibration: '#f59e0b', documen
 const SENTIMENT_LABEL = { positive: 'Позитивный', neutral: 'Нейтральный', negative: 'Негативный' };
 const SENTIMENT_COLOR = { positive: '#22c55e', neutral: '#94a3b8', negative: '#ef4444' };
 
-function count(tickets, key) {
-  return tickets.reduce((acc, t) => {
-    const val = t[key] || 'other';
-    acc[val] = (acc[val] || 0) + 1;
-    return acc;
-  }, {});
-}
-
 function BarChart({ data, labels, colors, total }) {
   return (
     <div className="stats-bars">
@@ -65,8 +59,15 @@ function DonutChart({ data, colors, total }) {
   );
 }
 
-export default function StatsPage({ tickets }) {
-  const total = tickets.length;
+// Счётчики считает сервер по всем заявкам: список на клиенте загружен только постранично
+export default function StatsPage() {
+  const [stats, setStats] = useState(null);
+
+  useEffect(() => {
+    fetchTicketStats().then(setStats).catch(() => setStats(null));
+  }, []);
+
+  const total = stats?.total ?? 0;
 
   if (total === 0) {
     return (
@@ -79,9 +80,7 @@ export default function StatsPage({ tickets }) {
     );
   }
 
-  const byStatus = count(tickets, 'status');
-  const byCategory = count(tickets, 'category');
-  const bySentiment = count(tickets, 'sentiment');
+  const { by_status: byStatus, by_category: byCategory, by_sentiment: bySentiment } = stats;
 
   const closedCount = byStatus['closed'] || 0;
   const resolutionRate = total > 0 ? Math.round((closedCount / total) * 100) : 0;
@@ -1,6 +1,8 @@
 import { useEffect, useState, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { fetchTickets, fetchMe, updateProfile } from '../api/tickets';
+import {
+  fetchTickets, fetchTicketChanges, fetchTicket, fetchMe, updateProfile, subscribeEvents,
+} from '../api/tickets';
 import TicketsList from '../components/TicketsList';
 import TicketForm from '../components/TicketForm';
 import ChatWindow from '../components/ChatWindow';
@@ -13,9 +15,32 @@ const NAV_TABS = ['Запросы', 'База знаний', 'Статистик
 const SIDEBAR_MIN = 180;
 const SIDEBAR_MAX = 520;
 
+const NO_FILTERS = { status: '', sentiment: '', category: '' };
+const FILTER_OPTIONS = {
+  status: { '': 'Все статусы', open: 'Новая', in_progress: 'В работе', needs_operator: 'Нужен оператор', closed: 'Закрыта' },
+  sentiment: { '': 'Любая тональность', positive: 'Позитивная', neutral: 'Нейтральная', negative: 'Негативная' },
+  category: { '': 'Все категории', malfunction: 'Неисправность', calibration: 'Калибровка', documentation: 'Документация', other: 'Прочее' },
+};
+
+function matchesFilters(ticket, filters) {
+  return Object.entries(filters).every(([key, value]) => !value || ticket[key] === value);
+}
+
+function applyTicket(list, ticket, filters) {
+  // Заявка, переставшая подходить под фильтры (например, сменила статус), уходит из списка
+  if (!matchesFilters(ticket, filters)) return list.filter((t) => t.id !== ticket.id);
+  if (list.some((t) => t.id === ticket.id)) {
+    return list.map((t) => (t.id === ticket.id ? ticket : t));
+  }
+  // Новая заявка попадает в начало, только если она новее загруженной первой страницы
+  if (list.length && ticket.date_received < list[0].date_received) return list;
+  return [ticket, ...list];
+}
+
 export default function TicketsPage() {
   const navigate = useNavigate();
   const [tickets, setTickets] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [selected, setSelected] = useState(null);
   const [activeTab, setActiveTab] = useState('Запросы');
@@ -25,6 +50,12 @@ export default function TicketsPage() {
   const [tgIds, setTgIds] = useState([]);
   const [profileSaving, setProfileSaving] = useState(false);
   const [profileMsg, setProfileMsg] = useState('');
+  const [chatEvent, setChatEvent] = useState(null);
+  const [filters, setFilters] = useState(NO_FILTERS);
+  const filtersRef = useRef(NO_FILTERS);
+  const loaded = useRef(false);
+  const selectedId = useRef(null);
+  const syncSince = useRef(null);
   const dragging = useRef(false);
   const startX = useRef(0);
   const startW = useRef(0);
@@ -34,18 +65,60 @@ export default function TicketsPage() {
   }, [navigate]);
 
   useEffect(() => {
-    fetchTickets()
-      .then((data) => {
-        setTickets(data);
-        setSelected(data[0] || null);
+    filtersRef.current = filters;
+    let stale = false;
+    fetchTickets(null, filters)
+      .then((page) => {
+        // Фильтр успели сменить ещё раз — этот ответ уже не нужен
+        if (stale) return;
+        setTickets(page.items);
+        setNextCursor(page.next_cursor);
+        syncSince.current = page.sync_since;
         setLoading(false);
+        if (!loaded.current && page.items[0]) handleSelect(page.items[0]);
+        loaded.current = true;
       })
       .catch(() => {
+        if (loaded.current) return;
         localStorage.removeItem('token');
         localStorage.removeItem('auth');
         navigate('/');
       });
-  }, [navigate]);
+    return () => { stale = true; };
+  }, [navigate, filters]);
+
+  useEffect(() => {
+    selectedId.current = selected?.id ?? null;
+  }, [selected?.id]);
+
+  // После обрыва push-канала догружаем только заявки, изменённые за это время
+  async function syncTickets() {
+    if (!syncSince.current) return;
+    let cursor = null;
+    do {
+      // Изменения берём без фильтров: заявка, вышедшая из-под фильтра, тоже должна уйти из списка
+      const page = await fetchTicketChanges(syncSince.current, cursor);
+      setTickets((prev) => page.items.reduce((list, t) => applyTicket(list, t, filtersRef.current), prev));
+      cursor = page.next_cursor;
+      if (!cursor && page.sync_since) syncSince.current = page.sync_since;
+    } while (cursor);
+  }
+
+  // Дельты с сервера вместо повторной загрузки списка
+  useEffect(() => {
+    return subscribeEvents((type, data) => {
+      if (type === 'ticket') {
+        setTickets((prev) => applyTicket(prev, data, filtersRef.current));
+        // В событии нет original_email / ai_response — открытую заявку догружаем целиком
+        if (selectedId.current === data.id) fetchTicket(data.id).then(setSelected).catch(() => {});
+      } else if (type === 'chat') {
+        setChatEvent({ message: data });
+      } else if (type === 'resync') {
+        syncTickets().catch(() => {});
+        setChatEvent({ resync: true });
+      }
+    });
+  }, []);
 
   const onMouseDown = useCallback((e) => {
     dragging.current = true;
@@ -117,6 +190,19 @@ export default function TicketsPage() {
     setTgIds((prev) => [...prev, '']);
   }
 
+  // Список приходит без original_email / ai_response — полную заявку догружаем отдельно
+  function handleSelect(ticket) {
+    setSelected(ticket);
+    fetchTicket(ticket.id).then(setSelected).catch(() => {});
+  }
+
+  async function handleLoadMore() {
+    if (!nextCursor) return;
+    const page = await fetchTickets(nextCursor, filters);
+    setTickets((prev) => [...prev, ...page.items]);
+    setNextCursor(page.next_cursor);
+  }
+
   function handleTicketUpdate(updated) {
     setSelected(updated);
     setTickets((prev) => prev.map((t) => (t.id === updated.id ? updated : t)));
@@ -140,7 +226,7 @@ export default function TicketsPage() {
           </nav>
         </div>
         <div className="crm-header-right">
-          {activeTab === 'Запросы' && <ExportButton tickets={tickets} />}
+          {activeTab === 'Запросы' && <ExportButton filters={filters} />}
           <button className="crm-profile-btn" onClick={handleOpenProfile}>Профиль</button>
           <button className="crm-logout-btn" onClick={handleLogout}>Выйти</button>
         </div>
@@ -202,7 +288,7 @@ export default function TicketsPage() {
 
       {activeTab === 'База знаний' && <KnowledgeBasePage />}
 
-      {activeTab === 'Статистика' && <StatsPage tickets={tickets} />}
+      {activeTab === 'Статистика' && <StatsPage />}
 
       {activeTab === 'Запросы' && (
         loading ? (
@@ -213,12 +299,31 @@ export default function TicketsPage() {
         ) : (
           <div className="crm-body">
             <div className="crm-sidebar" style={{ width: sidebarWidth }}>
-              <TicketsList tickets={tickets} selectedId={selected?.id} onSelect={setSelected} />
+              <div className="crm-filters">
+                {Object.entries(FILTER_OPTIONS).map(([key, options]) => (
+                  <select
+                    key={key}
+                    className="crm-filter"
+                    value={filters[key]}
+                    onChange={(e) => setFilters((prev) => ({ ...prev, [key]: e.target.value }))}
+                  >
+                    {Object.entries(options).map(([value, label]) => (
+                      <option key={value} value={value}>{label}</option>
+                    ))}
+                  </select>
+                ))}
+              </div>
+              <TicketsList
+                tickets={tickets}
+                selectedId={selected?.id}
+                onSelect={handleSelect}
+                onLoadMore={nextCursor ? handleLoadMore : null}
+              />
             </div>
             <div className="crm-resize-handle" onMouseDown={onMouseDown} />
             <div className="crm-detail">
               <TicketForm ticket={selected} onTicketUpdate={handleTicketUpdate} />
-              <ChatWindow ticket={selected} onTicketUpdate={handleTicketUpdate} />
+              <ChatWindow ticket={selected} onTicketUpdate={handleTicketUpdate} chatEvent={chatEvent} />
             </div>
           </div>
         )